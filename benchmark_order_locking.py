@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark how long checkout holds product row locks as the cart grows.
+
+Compares the old per-item pattern (one SELECT ... FOR UPDATE, one INSERT and
+one UPDATE per cart line) with the set-based helpers used by
+checkout (one ordered SELECT ... FOR UPDATE, one multi-row INSERT,
+one set-based UPDATE).
+
+The benchmark runs against the database configured in .env, but only touches
+TEMPORARY tables named products/order_items, which shadow the real tables for
+this session and disappear when it ends. No shop data is read or modified.
+
+Usage:
+    python benchmark_order_locking.py [--sizes 1,5,10,25,50,100] [--runs 20]
+"""
+
+import argparse
+import statistics
+import time
+
+import pymysql
+
+from main import DB_CONFIG, lock_and_check_stock, insert_order_items, decrement_stock
+
+
+def setup_temporary_tables(conn, product_count):
+    """Create session-private products/order_items tables with plenty of stock"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMPORARY TABLE products (
+            id BIGINT UNSIGNED PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            quantity INT NOT NULL
+        ) ENGINE=InnoDB
+    """)
+    cursor.execute("""
+        CREATE TEMPORARY TABLE order_items (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            order_id BIGINT UNSIGNED NOT NULL,
+            product_id BIGINT UNSIGNED NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            INDEX idx_order_id (order_id)
+        ) ENGINE=InnoDB
+    """)
+    cursor.executemany(
+        "INSERT INTO products (id, title, quantity) VALUES (%s, %s, %s)",
+        [(i, f"Benchmark product {i}", 1_000_000) for i in range(1, product_count + 1)]
+    )
+    conn.commit()
+
+
+def reserve_per_item(cursor, order_id, items):
+    """The previous checkout pattern: 3 round trips per cart line"""
+    for item in items:
+        cursor.execute("SELECT title, quantity FROM products WHERE id = %s FOR UPDATE", (item['product_id'],))
+        cursor.fetchone()
+    for item in items:
+        cursor.execute(
+            "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+            (order_id, item['product_id'], item['quantity'], item['price'])
+        )
+        cursor.execute("UPDATE products SET quantity = quantity - %s WHERE id = %s", (item['quantity'], item['product_id']))
+
+
+def reserve_set_based(cursor, order_id, items):
+    """The current checkout pattern: 3 round trips per order"""
+    quantities, _ = lock_and_check_stock(cursor, items)
+    insert_order_items(cursor, order_id, items)
+    decrement_stock(cursor, quantities)
+
+
+def measure(conn, strategy, cart_size, runs):
+    """Median and p95 lock hold time (first lock to commit) in milliseconds"""
+    cursor = conn.cursor()
+    # Shuffle ids so the per-item pattern does not get sorted input for free
+    items = [
+        {'product_id': product_id, 'quantity': 1, 'price': 19.99}
+        for product_id in sorted(range(1, cart_size + 1), key=lambda i: (i * 7919) % (cart_size + 1))
+    ]
+    timings = []
+    for order_id in range(runs):
+        conn.begin()
+        started = time.perf_counter()
+        strategy(cursor, order_id, items)
+        conn.commit()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,5,10,25,50,100", help="comma-separated cart sizes")
+    parser.add_argument("--runs", type=int, default=20, help="orders per cart size and strategy")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    conn = pymysql.connect(**DB_CONFIG)
+    try:
+        setup_temporary_tables(conn, max(sizes))
+
+        print("🔒 Product row lock hold time per order (ms, first lock to commit)")
+        print("-" * 72)
+        print(f"{'cart size':>9} | {'per-item median':>15} {'p95':>8} | {'set-based median':>16} {'p95':>8} | {'speedup':>7}")
+        for size in sizes:
+            legacy_median, legacy_p95 = measure(conn, reserve_per_item, size, args.runs)
+            batched_median, batched_p95 = measure(conn, reserve_set_based, size, args.runs)
+            speedup = legacy_median / batched_median if batched_median else float("inf")
+            print(f"{size:>9} | {legacy_median:>15.2f} {legacy_p95:>8.2f} | {batched_median:>16.2f} {batched_p95:>8.2f} | {speedup:>6.1f}x")
+        print("-" * 72)
+        print("Round trips while holding locks: per-item = 3 x cart size, set-based = 3")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
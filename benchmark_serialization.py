@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark product list serialization.
+
+Serializes lists of product dicts shaped like the /products/ output with:
+
+- response_model: what FastAPI does for a returned dict (validate against
+  List[ProductResponse], dump to JSON-compatible data, json.dumps)
+- validated dump_json: TypeAdapter validate + dump_json (TRUSTED_OUTPUT=false)
+- json.dumps / orjson.dumps: the trusted path (fast_json.dumps uses orjson
+  when it is installed)
+
+No database or server is needed.
+
+Usage:
+    python benchmark_serialization.py [--sizes 50,1000,10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from fast_json import orjson
+from main import ProductResponse
+
+product_list_adapter = TypeAdapter(List[ProductResponse])
+
+
+def build_products(count):
+    products = []
+    for n in range(count):
+        thumb = f"https://res.cloudinary.com/trendyoft/image/upload/w_300,h_300,c_fill,q_auto:low,f_auto/v1/products/{n}.jpg"
+        products.append({
+            'id': n + 1,
+            'title': f"Striped Adventure Tee #{n}",
+            'price': 19.99 + n % 7,
+            'quantity': n % 40,
+            'category': ("clothing", "accessories", "shoes")[n % 3],
+            'image_url': thumb,
+            'images': {'thumbnail': thumb, 'main': thumb, 'original': thumb},
+            'description': '',
+            'created_at': '',
+            'updated_at': None,
+            'is_active': True,
+            'stock_status': 'In Stock' if n % 40 else 'Out of Stock'
+        })
+    return products
+
+
+def response_model(products):
+    validated = product_list_adapter.validate_python(products)
+    data = product_list_adapter.dump_python(validated, mode="json")
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def validated_dump_json(products):
+    return product_list_adapter.dump_json(product_list_adapter.validate_python(products))
+
+
+def stdlib_json(products):
+    return json.dumps(products, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def median_ms(func, products, repeat):
+    func(products)  # warm up
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(products)
+        runs.append((time.perf_counter() - started) * 1000)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50,1000,10000", help="comma-separated list sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (median is reported)")
+    args = parser.parse_args()
+
+    serializers = [
+        ("response_model", response_model),
+        ("validated dump_json", validated_dump_json),
+        ("json.dumps", stdlib_json),
+    ]
+    if orjson is not None:
+        serializers.append(("orjson.dumps", orjson.dumps))
+    else:
+        print("ℹ️  orjson is not installed; the trusted path uses json.dumps")
+
+    for size in (int(size) for size in args.sizes.split(",")):
+        products = build_products(size)
+        print(f"\n📦 {size} products ({len(stdlib_json(products)) / 1024:.1f} KB)")
+        print("-" * 56)
+        results = [(label, median_ms(func, products, args.repeat)) for label, func in serializers]
+        baseline = results[0][1]
+        for label, ms in results:
+            print(f"{label:<24} {ms:>10.3f} ms  {baseline / ms:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark email delivery throughput against the local SMTP sink.
+
+Compares the old send_email pattern (new SMTP session + login for every
+message) with the persistent SMTPTransport, one message at a time and in
+batches. Runs entirely on localhost; --latency-ms adds a delay before each
+server reply to approximate the round trip to a real provider.
+
+Usage:
+    python benchmark_smtp_throughput.py [--messages 200] [--latency-ms 5]
+"""
+
+import argparse
+import smtplib
+import time
+from email.mime.text import MIMEText
+
+from mailer import SMTPTransport
+from smtp_sink import SMTPSink
+
+FROM_ADDR = "orders@trendyoft.test"
+TO_ADDR = "customer@trendyoft.test"
+
+
+def build_message(n):
+    msg = MIMEText(f"Thank you for your order!\nYour order has been successfully placed with ID: {n}.", "plain")
+    msg['From'] = f'TrendyOft <{FROM_ADDR}>'
+    msg['To'] = TO_ADDR
+    msg['Subject'] = "Your TrendyOft Order Confirmation"
+    return msg.as_string()
+
+
+def send_with_new_sessions(port, messages):
+    """The previous send_email: connect, EHLO, login, send, quit - per message"""
+    for message in messages:
+        server = smtplib.SMTP("127.0.0.1", port)
+        server.ehlo()
+        server.login("bench", "bench")
+        server.sendmail(FROM_ADDR, TO_ADDR, message)
+        server.quit()
+
+
+def send_with_transport(port, messages):
+    transport = SMTPTransport("127.0.0.1", port, username="bench", password="bench", use_tls=False,
+                              max_messages_per_connection=len(messages) + 1)
+    for message in messages:
+        transport.send(FROM_ADDR, TO_ADDR, message)
+    transport.close()
+    return transport.stats()
+
+
+def send_with_transport_batches(port, messages, batch_size):
+    transport = SMTPTransport("127.0.0.1", port, username="bench", password="bench", use_tls=False,
+                              max_messages_per_connection=len(messages) + 1)
+    for start in range(0, len(messages), batch_size):
+        batch = [(FROM_ADDR, TO_ADDR, message) for message in messages[start:start + batch_size]]
+        errors = [error for error in transport.send_many(batch) if error]
+        if errors:
+            raise errors[0]
+    transport.close()
+    return transport.stats()
+
+
+def timed(label, func, *args):
+    started = time.perf_counter()
+    stats = func(*args)
+    elapsed = time.perf_counter() - started
+    return label, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated delay per SMTP reply")
+    args = parser.parse_args()
+
+    sink = SMTPSink(port=0, latency=args.latency_ms / 1000).start_in_thread()
+    messages = [build_message(n) for n in range(args.messages)]
+
+    print(f"📧 {args.messages} messages, {args.latency_ms} ms per SMTP reply (local sink on port {sink.port})")
+    print("-" * 64)
+    results = [
+        timed("new session per message", send_with_new_sessions, sink.port, messages),
+        timed("persistent transport", send_with_transport, sink.port, messages),
+        timed(f"persistent, batches of {args.batch_size}", send_with_transport_batches, sink.port, messages, args.batch_size),
+    ]
+    baseline = results[0][1]
+    for label, elapsed, stats in results:
+        sessions = stats["connections_opened"] if stats else args.messages
+        print(f"{label:<32} {args.messages / elapsed:>8.1f} msg/s  {sessions:>4} sessions  {baseline / elapsed:>5.1f}x")
+    print("-" * 64)
+    print(f"Sink received {sink.messages_received} messages in {sink.sessions} sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Flash-sale contention benchmark: many buyers ordering the same SKU at once.
+
+Compares the two ORDER_STOCK_MODE strategies used by checkout (see
+insert_order_to_db and claim_order_stock in main.py):
+
+- pessimistic: SELECT ... FOR UPDATE first, so the SKU row stays locked while
+  the rest of the order is written
+- optimistic: non-locking existence check, order written first, stock claimed
+  by a conditional UPDATE (quantity >= n) as the last statement before commit
+
+Each simulated checkout also spends --work-ms inside the transaction, standing
+in for the order/customer/address/payment inserts of a real checkout.
+
+Row locks have to be shared between connections, so this cannot use TEMPORARY
+tables. It creates a scratch database (default: trendyoft_bench) with minimal
+products/order_items tables. Your shop database is never touched.
+
+Usage:
+    python benchmark_stock_contention.py [--buyers 32] [--orders 20] [--work-ms 5]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import pymysql
+
+from main import (
+    DB_CONFIG, HTTPException, check_products_exist, decrement_stock,
+    decrement_stock_if_available, insert_order_items, lock_and_check_stock
+)
+
+SKU_ID = 1
+
+
+def bench_config(database):
+    return {**DB_CONFIG, 'database': database}
+
+
+def setup_database(database):
+    """Create the scratch database and its tables"""
+    conn = pymysql.connect(**{**DB_CONFIG, 'database': None})
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+        cursor.execute(f"USE `{database}`")
+        cursor.execute("DROP TABLE IF EXISTS order_items")
+        cursor.execute("DROP TABLE IF EXISTS products")
+        cursor.execute("""
+            CREATE TABLE products (
+                id BIGINT UNSIGNED PRIMARY KEY,
+                title VARCHAR(255) NOT NULL,
+                quantity INT NOT NULL
+            ) ENGINE=InnoDB
+        """)
+        cursor.execute("""
+            CREATE TABLE order_items (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                order_id BIGINT UNSIGNED NOT NULL,
+                product_id BIGINT UNSIGNED NOT NULL,
+                quantity INT NOT NULL,
+                price DECIMAL(10, 2) NOT NULL
+            ) ENGINE=InnoDB
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reset_stock(database, quantity):
+    conn = pymysql.connect(**bench_config(database))
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM order_items")
+        cursor.execute("DELETE FROM products")
+        cursor.execute("INSERT INTO products (id, title, quantity) VALUES (%s, %s, %s)",
+                       (SKU_ID, "Flash sale tee", quantity))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def checkout(cursor, mode, order_id, work_seconds):
+    """One single-item order following checkout's statement order: stock is claimed last"""
+    items = [{'product_id': SKU_ID, 'quantity': 1, 'price': 9.99}]
+    if mode == "optimistic":
+        quantities, _ = check_products_exist(cursor, items)
+    else:
+        quantities, _ = lock_and_check_stock(cursor, items)
+    time.sleep(work_seconds)  # order/customer/address/payment inserts
+    insert_order_items(cursor, order_id, items)
+    if mode == "optimistic":
+        decrement_stock_if_available(cursor, quantities)
+    else:
+        decrement_stock(cursor, quantities)
+
+
+def buyer(database, mode, buyer_id, orders, work_seconds, results):
+    conn = pymysql.connect(**bench_config(database))
+    cursor = conn.cursor()
+    try:
+        for n in range(orders):
+            started = time.perf_counter()
+            conn.begin()
+            try:
+                checkout(cursor, mode, buyer_id * orders + n, work_seconds)
+                conn.commit()
+                outcome = "ok"
+            except HTTPException:
+                conn.rollback()
+                outcome = "sold_out"
+            except pymysql.err.OperationalError as e:
+                conn.rollback()
+                outcome = f"error_{e.args[0]}"
+            results.append((outcome, time.perf_counter() - started))
+    finally:
+        conn.close()
+
+
+def run_mode(database, mode, buyers, orders, stock, work_seconds):
+    reset_stock(database, stock)
+    results = []
+    threads = [
+        threading.Thread(target=buyer, args=(database, mode, i, orders, work_seconds, results))
+        for i in range(buyers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for _, latency in results)
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    print(f"\n📦 {mode}")
+    print(f"   checkouts/s : {len(results) / elapsed:.1f}")
+    print(f"   latency ms  : p50 {statistics.median(latencies):.1f}  p95 {percentile(0.95):.1f}  p99 {percentile(0.99):.1f}")
+    print(f"   outcomes    : {outcomes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="trendyoft_bench", help="scratch database to create/use")
+    parser.add_argument("--buyers", type=int, default=32, help="concurrent buyers (one connection each)")
+    parser.add_argument("--orders", type=int, default=20, help="orders per buyer")
+    parser.add_argument("--stock", type=int, default=None, help="initial SKU stock (default: enough for everyone)")
+    parser.add_argument("--work-ms", type=float, default=5.0, help="simulated in-transaction checkout work")
+    parser.add_argument("--modes", default="pessimistic,optimistic")
+    args = parser.parse_args()
+
+    stock = args.stock if args.stock is not None else args.buyers * args.orders
+    setup_database(args.database)
+    print(f"🛒 {args.buyers} buyers x {args.orders} orders on one SKU (stock {stock}, {args.work_ms} ms work per checkout)")
+    for mode in args.modes.split(","):
+        run_mode(args.database, mode.strip(), args.buyers, args.orders, stock, args.work_ms / 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Catalog version counter shared by every worker process.
+
+Each worker caches catalog responses in its own memory, so a write handled
+by one worker is invisible to the caches of the others. Admin writes bump a
+single-row ``catalog_version`` counter in the same transaction as the
+product change; every worker reads the counter at most once per
+``check_interval`` (one primary-key lookup) and drops cache entries built
+under an older version. Caches stay correct across workers without
+shortening their TTL.
+
+``SWRCache`` is the per-worker response cache those versions apply to, and
+``LRUCache`` the per-worker cache of individual rows.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+CREATE_CATALOG_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id TINYINT UNSIGNED PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+"""
+
+CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", 1))
+
+
+def bump_catalog_version(cursor):
+    """
+    Increment the counter using the caller's cursor, so the bump commits
+    (or rolls back) together with the product change. Returns the new
+    version, or None when the table has not been migrated yet.
+    """
+    try:
+        cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+            raise
+        logger.warning("catalog_version table is missing; run 'python migrations.py migrate'")
+        return None
+    return read_catalog_version(cursor)
+
+
+def read_catalog_version(cursor):
+    cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+    row = cursor.fetchone()
+    return row['version'] if row else None
+
+
+class CatalogVersion:
+    """
+    This worker's view of the catalog version.
+
+    ``connection_factory`` is a context manager factory yielding a primary
+    database connection and ``run_blocking`` an awaitable runner for
+    blocking calls. ``on_change(old, new)`` is called when another process's
+    write is noticed.
+    """
+
+    def __init__(self, connection_factory, run_blocking, check_interval=CHECK_INTERVAL, on_change=None):
+        self.connection_factory = connection_factory
+        self.run_blocking = run_blocking
+        self.check_interval = check_interval
+        self.on_change = on_change
+
+        self._version = None
+        self._checked_at = 0.0
+        self._checking = False
+        self._checks = 0
+        self._changes = 0
+        self._errors = 0
+
+    def _read(self):
+        with self.connection_factory() as conn:
+            return read_catalog_version(conn.cursor())
+
+    async def current(self):
+        """
+        The latest known version, re-read from the database when the last
+        check is older than ``check_interval``. Only one request per worker
+        does the check; the others use the previous value meanwhile.
+        """
+        if self._checking or time.monotonic() - self._checked_at < self.check_interval:
+            return self._version
+        self._checking = True
+        try:
+            version = await self.run_blocking(self._read)
+            self._checks += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._errors += 1
+            logger.warning(f"Could not read catalog version: {e}")
+            return self._version
+        finally:
+            self._checked_at = time.monotonic()
+            self._checking = False
+        self.observe(version)
+        return self._version
+
+    @property
+    def version(self):
+        """Latest known version, without checking the database"""
+        return self._version
+
+    def observe(self, version):
+        """Record a version seen or written by this worker"""
+        if version is None or version == self._version:
+            return
+        old, self._version = self._version, version
+        if old is not None:
+            self._changes += 1
+            if self.on_change is not None:
+                self.on_change(old, version)
+
+    def stats(self):
+        return {
+            "version": self._version,
+            "check_interval": self.check_interval,
+            "checks": self._checks,
+            "changes_seen": self._changes,
+            "errors": self._errors,
+        }
+
+
+class _Entry:
+    __slots__ = ("value", "version", "created_at")
+
+    def __init__(self, value, version, created_at):
+        self.value = value
+        self.version = version
+        self.created_at = created_at
+
+
+class SWRCache:
+    """
+    In-process response cache with stale-while-revalidate semantics.
+
+    - Younger than ``ttl``: served as is.
+    - Up to ``stale_while_revalidate`` seconds past the TTL: served
+      immediately while one background task reloads it.
+    - Missing, older, or built under another catalog version: the caller
+      waits for the reload. Concurrent callers share a single load per key
+      and version (single flight), so an expiry never stampedes the database.
+    - If a load fails, an entry up to ``stale_if_error`` seconds past its TTL
+      is served instead of the error.
+
+    Keys are bounded to ``max_entries`` (least recently used evicted first).
+    Must be used from a single event loop, i.e. one instance per worker.
+    """
+
+    def __init__(self, ttl, stale_while_revalidate=0, stale_if_error=0, max_entries=256, name="cache"):
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.max_entries = max_entries
+        self.name = name
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._loads = 0
+        self._load_errors = 0
+        self._stale_if_error_served = 0
+
+    async def get(self, key, loader, version=None):
+        """Cached value for ``key``; ``loader`` is an async callable producing a fresh one"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry.version == version:
+            age = now - entry.created_at
+            if age < self.ttl:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if age < self.ttl + self.stale_while_revalidate:
+                self._stale_hits += 1
+                self._load(key, loader, version)
+                return entry.value
+
+        self._misses += 1
+        try:
+            return await asyncio.shield(self._load(key, loader, version))
+        except Exception as e:
+            if entry is not None and now - entry.created_at < self.ttl + self.stale_if_error:
+                self._stale_if_error_served += 1
+                logger.warning(f"{self.name}: serving stale '{key}' after load failure: {e}")
+                return entry.value
+            raise
+
+    def _load(self, key, loader, version):
+        """The in-flight load for (key, version), started if there is none"""
+        flight = (key, version)
+        task = self._inflight.get(flight)
+        if task is not None:
+            self._coalesced += 1
+            return task
+        task = asyncio.get_running_loop().create_task(self._run_loader(flight, key, loader, version))
+        # Background refreshes may have no awaiter; retrieve the error so it is not reported as lost
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[flight] = task
+        return task
+
+    async def _run_loader(self, flight, key, loader, version):
+        self._loads += 1
+        try:
+            value = await loader()
+        except Exception as e:
+            self._load_errors += 1
+            logger.error(f"{self.name}: loading '{key}' failed: {e}")
+            raise
+        finally:
+            self._inflight.pop(flight, None)
+        self._entries[key] = _Entry(value, version, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "loads": self._loads,
+            "load_errors": self._load_errors,
+            "stale_if_error_served": self._stale_if_error_served,
+        }
+
+
+class LRUCache:
+    """
+    Bounded LRU + TTL cache for rows read by blocking database helpers.
+
+    Unlike ``SWRCache`` it is synchronous and thread-safe, so it can be used
+    from the database executor threads. An entry is a miss once it is older
+    than ``ttl`` or was stored under another catalog version. Writers call
+    ``invalidate``; a loader that started before an invalidation passes the
+    ``generation`` it read beforehand to ``put``, so it cannot store the row
+    it read before the write.
+    """
+
+    def __init__(self, max_entries=1024, ttl=30, name="cache"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key, version=None):
+        """Cached value for ``key``, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.version != version or time.monotonic() - entry.created_at >= self.ttl:
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def put(self, key, value, version=None, generation=None):
+        """Store ``value``; skipped if anything was invalidated since ``generation`` was read"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = _Entry(value, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 3) if lookups else None,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
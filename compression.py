@@ -0,0 +1,249 @@
+"""
+Response compression.
+
+Cached responses are serialized and compressed once, when the cache is
+filled; every hit then only picks the variant the client accepts. Brotli is
+used when the ``brotli`` package is installed, gzip always. The ETag is
+computed at the same time, so revalidations are answered from the cache too.
+Static files get the same treatment through ``encoded_file``.
+
+Everything else goes through ``CompressionMiddleware``, which compresses
+responses above ``COMPRESS_MIN_SIZE`` per request at cheaper levels, and
+leaves responses that already carry a Content-Encoding alone.
+"""
+
+import gzip
+import os
+import time
+import zlib
+from functools import lru_cache
+
+from fastapi import Response
+from starlette.datastructures import MutableHeaders
+
+from http_cache import content_etag, http_date, is_not_modified, not_modified
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 512))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 9))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 9))
+# Per-request compression trades ratio for latency
+DYNAMIC_GZIP_LEVEL = int(os.getenv("DYNAMIC_GZIP_LEVEL", 6))
+DYNAMIC_BROTLI_QUALITY = int(os.getenv("DYNAMIC_BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+# Streams must reach the client as they are written
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+# Server preference when the client accepts several encodings equally
+PREFERRED_ENCODINGS = ("br", "gzip")
+
+
+def compress(body, encoding, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def available_encodings():
+    return [encoding for encoding in PREFERRED_ENCODINGS if encoding != "br" or brotli is not None]
+
+
+def accepted_encodings(header):
+    """Parse Accept-Encoding into ``{coding: q}``"""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header, available):
+    """Best encoding in ``available`` the client accepts, or ``identity``"""
+    accepted = accepted_encodings(header)
+    best, best_q = "identity", 0.0
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class EncodedBody:
+    """
+    A response body with its compressed variants and validators, built once.
+    ``last_modified`` (epoch seconds) defaults to the build time.
+    """
+
+    __slots__ = ("media_type", "variants", "etag", "last_modified")
+
+    def __init__(self, body, media_type="application/json", last_modified=None):
+        self.media_type = media_type
+        self.variants = {"identity": body}
+        self.etag = content_etag(body)
+        self.last_modified = last_modified if last_modified is not None else time.time()
+        if len(body) >= COMPRESS_MIN_SIZE:
+            for encoding in available_encodings():
+                self.variants[encoding] = compress(body, encoding)
+
+    @property
+    def body(self):
+        return self.variants["identity"]
+
+    def sizes(self):
+        return {encoding: len(data) for encoding, data in self.variants.items()}
+
+    def _headers(self, headers):
+        return {
+            "Vary": "Accept-Encoding",
+            "ETag": self.etag,
+            "Last-Modified": http_date(self.last_modified),
+            **(headers or {}),
+        }
+
+    def response(self, accept_encoding=None, status_code=200, headers=None):
+        encoding = choose_encoding(accept_encoding, [e for e in self.variants if e != "identity"])
+        response_headers = self._headers(headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(
+            content=self.variants[encoding],
+            status_code=status_code,
+            media_type=self.media_type,
+            headers=response_headers,
+        )
+
+    def conditional_response(self, request_headers, headers=None):
+        """304 when the client's copy is current (If-None-Match / If-Modified-Since), else the body"""
+        if is_not_modified(request_headers, self.etag, self.last_modified):
+            return not_modified(self._headers(headers))
+        return self.response(request_headers.get("accept-encoding"), headers=headers)
+
+
+@lru_cache(maxsize=32)
+def _encoded_file(path, mtime_ns, size, media_type):
+    with open(path, "rb") as f:
+        return EncodedBody(f.read(), media_type, last_modified=mtime_ns / 1e9)
+
+
+def encoded_file(path, media_type):
+    """A static file as an ``EncodedBody``, re-read and re-compressed only when it changes"""
+    stat = os.stat(path)
+    return _encoded_file(path, stat.st_mtime_ns, stat.st_size, media_type)
+
+
+def is_compressible(content_type):
+    content_type = (content_type or "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(UNCOMPRESSED_TYPES)
+
+
+class _StreamCompressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=DYNAMIC_BROTLI_QUALITY)
+            self.compress, self.finish = self._compressor.process, self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(DYNAMIC_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+            self.compress, self.finish = self._compressor.compress, self._compressor.flush
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing dynamic responses (gzip or brotli, as
+    negotiated) when they are compressible and at least ``minimum_size``
+    bytes. Responses that already have a Content-Encoding, such as
+    ``EncodedBody`` responses, partial content and ``no-transform``
+    responses pass through untouched. Streamed bodies are compressed chunk
+    by chunk.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = choose_encoding(accept_encoding, available_encodings())
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding, minimum_size):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _should_compress(self, headers):
+        return (
+            self.start["status"] not in (204, 206, 304)
+            and "content-encoding" not in headers
+            and "content-range" not in headers
+            and "no-transform" not in headers.get("cache-control", "")
+            and is_compressible(headers.get("content-type"))
+        )
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = not self._should_compress(MutableHeaders(scope=message))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            headers = MutableHeaders(scope=self.start)
+            if not more_body:
+                # Whole body in one message: compress only if it is worth it
+                if len(body) >= self.minimum_size:
+                    body = compress(body, self.encoding, DYNAMIC_GZIP_LEVEL, DYNAMIC_BROTLI_QUALITY)
+                    headers["Content-Encoding"] = self.encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            self.compressor = _StreamCompressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["content-length"]
+            await self.send(self.start)
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -81,6 +81,24 @@ DATABASE_SCHEMA = {
             "quantity",
             "price"
         ]
+    },
+    
+    "email_outbox": {
+        "table_name": "email_outbox",
+        "columns": [
+            "id",
+            "order_id",
+            "recipient",
+            "subject",
+            "body",
+            "customer_name",
+            "status",
+            "attempts",
+            "next_attempt_at",
+            "last_error",
+            "created_at",
+            "sent_at"
+        ]
     }
 }
 
@@ -0,0 +1,247 @@
+"""
+Durable email outbox for order notifications.
+
+Checkout only INSERTs the emails it wants to send into ``email_outbox``,
+inside the order transaction, so an email exists if and only if its order
+committed. A background worker (in-process, or ``python email_outbox.py`` as
+a separate process) drains the table with retries and exponential backoff;
+messages that keep failing end up in the ``dead`` state for inspection.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CREATE_EMAIL_OUTBOX_TABLE = """
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    order_id BIGINT UNSIGNED,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    customer_name VARCHAR(255),
+    status ENUM('pending', 'sending', 'sent', 'dead') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP NULL,
+    INDEX idx_status_next_attempt (status, next_attempt_at),
+    INDEX idx_order_id (order_id)
+) ENGINE=InnoDB;
+"""
+
+# Worker tuning
+BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 20))
+POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", 10))
+LEASE_SECONDS = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", 120))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 8))
+BACKOFF_BASE = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE", 30))
+BACKOFF_MAX = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX", 3600))
+
+
+def enqueue_email(cursor, subject, body, to_email, customer_name=None, order_id=None):
+    """Queue an email using the caller's cursor (and therefore its transaction)"""
+    if not to_email:
+        logger.warning(f"Not queueing email '{subject}': no recipient")
+        return None
+    cursor.execute("""
+        INSERT INTO email_outbox (order_id, recipient, subject, body, customer_name)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (order_id, to_email, subject, body, customer_name))
+    return cursor.lastrowid
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt (exponential backoff with jitter)"""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim_due_emails(conn, batch_size=BATCH_SIZE):
+    """
+    Lease a batch of due emails to this worker. Rows are marked ``sending``
+    with a lease; if the worker dies mid-send the lease expires and the rows
+    are picked up again. SKIP LOCKED lets several workers drain in parallel.
+    """
+    cursor = conn.cursor()
+    conn.begin()
+    try:
+        cursor.execute("""
+            SELECT id, order_id, recipient, subject, body, customer_name, attempts
+            FROM email_outbox
+            WHERE status IN ('pending', 'sending') AND next_attempt_at <= NOW()
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (batch_size,))
+        rows = cursor.fetchall()
+        if rows:
+            placeholders = ", ".join(["%s"] * len(rows))
+            cursor.execute(f"""
+                UPDATE email_outbox
+                SET status = 'sending', attempts = attempts + 1,
+                    next_attempt_at = NOW() + INTERVAL %s SECOND
+                WHERE id IN ({placeholders})
+            """, [LEASE_SECONDS] + [row['id'] for row in rows])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for row in rows:
+        row['attempts'] += 1
+    return rows
+
+
+def mark_sent(conn, email_id):
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE email_outbox SET status = 'sent', sent_at = NOW(), last_error = NULL WHERE id = %s",
+        (email_id,)
+    )
+    conn.commit()
+
+
+def mark_failed(conn, row, error):
+    """Schedule a retry, or dead-letter the email once its attempts are used up"""
+    cursor = conn.cursor()
+    if row['attempts'] >= MAX_ATTEMPTS:
+        cursor.execute(
+            "UPDATE email_outbox SET status = 'dead', last_error = %s WHERE id = %s",
+            (str(error)[:2000], row['id'])
+        )
+        logger.error(f"Email {row['id']} to {row['recipient']} moved to dead letter after {row['attempts']} attempts: {error}")
+    else:
+        cursor.execute("""
+            UPDATE email_outbox
+            SET status = 'pending', last_error = %s,
+                next_attempt_at = NOW() + INTERVAL %s SECOND
+            WHERE id = %s
+        """, (str(error)[:2000], int(retry_delay(row['attempts'])), row['id']))
+        logger.warning(f"Email {row['id']} to {row['recipient']} failed (attempt {row['attempts']}), will retry: {error}")
+    conn.commit()
+
+
+class EmailOutboxWorker:
+    """
+    Drains ``email_outbox`` in the background.
+
+    ``connection_factory`` is a context manager factory yielding a database
+    connection, ``sender(row)`` delivers one email and raises on failure, and
+    ``run_blocking`` is an awaitable runner for blocking calls (the API's
+    database executor) so the event loop never waits on SMTP or MySQL.
+    """
+
+    def __init__(self, connection_factory, sender, run_blocking, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+        self.connection_factory = connection_factory
+        self.sender = sender
+        self.run_blocking = run_blocking
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._task = None
+        self._loop = None
+        self._wake_event = None
+        self._stats_lock = threading.Lock()
+        self._sent = 0
+        self._failed = 0
+        self._dead = 0
+        self._last_drain_at = None
+
+    def drain_once(self):
+        """Send one batch of due emails; returns how many rows were claimed"""
+        with self.connection_factory() as conn:
+            rows = claim_due_emails(conn, self.batch_size)
+            for row in rows:
+                try:
+                    self.sender(row)
+                except Exception as e:
+                    mark_failed(conn, row, e)
+                    with self._stats_lock:
+                        self._failed += 1
+                        if row['attempts'] >= MAX_ATTEMPTS:
+                            self._dead += 1
+                else:
+                    mark_sent(conn, row['id'])
+                    with self._stats_lock:
+                        self._sent += 1
+        with self._stats_lock:
+            self._last_drain_at = time.time()
+        return len(rows)
+
+    async def _run(self):
+        logger.info("Email outbox worker started")
+        while True:
+            self._wake_event.clear()
+            try:
+                claimed = await self.run_blocking(self.drain_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email outbox drain failed: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more work is probably waiting
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start draining on the running event loop"""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake_event = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Ask the worker to drain now (safe to call from any thread)"""
+        if self._loop is not None and self._wake_event is not None:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "running": self._task is not None and not self._task.done(),
+                "sent": self._sent,
+                "failed_attempts": self._failed,
+                "dead_lettered": self._dead,
+                "last_drain_at": self._last_drain_at,
+            }
+
+
+def main():
+    """Drain the outbox from a separate process (e.g. a worker dyno or cron job)"""
+    import argparse
+    from main import get_db_connection, deliver_outbox_email
+
+    parser = argparse.ArgumentParser(description="Deliver queued order emails")
+    parser.add_argument("--once", action="store_true", help="drain what is due and exit (for cron)")
+    args = parser.parse_args()
+
+    worker = EmailOutboxWorker(get_db_connection, deliver_outbox_email, run_blocking=None)
+    while True:
+        while worker.drain_once() >= worker.batch_size:
+            pass
+        if args.once:
+            break
+        time.sleep(worker.poll_interval)
+    print(worker.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Fast JSON responses for output the API builds itself.
+
+``dumps`` uses ``orjson`` when it is installed and the standard library
+otherwise. ``FastJSONResponse`` renders with it, and ``trusted_response``
+returns handler-built data without FastAPI re-validating it against the
+route's ``response_model`` (which stays declared for the OpenAPI schema).
+Set ``TRUSTED_OUTPUT=false`` to validate such responses anyway, e.g. while
+changing a model.
+"""
+
+import datetime
+import decimal
+import json
+import os
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: standard library json
+    orjson = None
+
+TRUSTED_OUTPUT = os.getenv("TRUSTED_OUTPUT", "true").lower() in ("1", "true", "yes")
+
+
+def _default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def trusted_response(content, adapter=None, status_code=200, headers=None):
+    """
+    Response for data built by the handler itself. ``adapter`` (a pydantic
+    ``TypeAdapter`` of the response model) is only used when TRUSTED_OUTPUT
+    is off.
+    """
+    if adapter is not None and not TRUSTED_OUTPUT:
+        content = adapter.dump_python(adapter.validate_python(content), mode="json")
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
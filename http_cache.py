@@ -0,0 +1,83 @@
+"""
+HTTP validators for catalog responses.
+
+Responses carry an ``ETag`` (weak, since the same representation is served
+under several content encodings), optionally a ``Last-Modified``, and a
+``Cache-Control`` policy. A request whose ``If-None-Match`` (or, when that
+is absent, ``If-Modified-Since``) still matches gets an empty 304 instead
+of the body.
+"""
+
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Response
+
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 60))
+CATALOG_STALE_WHILE_REVALIDATE = int(os.getenv("CATALOG_STALE_WHILE_REVALIDATE", 300))
+CATALOG_CACHE_CONTROL = (
+    f"public, max-age={CATALOG_MAX_AGE}, stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE}"
+)
+
+
+def content_etag(body):
+    """Weak ETag for a response body"""
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def make_etag(*parts):
+    """Weak ETag for whatever identifies a representation (versions, row values, ...)"""
+    return content_etag("|".join(str(part) for part in parts).encode())
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def _parse_http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _opaque(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of ``etag`` against an If-None-Match header"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(_opaque(tag) == _opaque(etag) for tag in if_none_match.split(","))
+
+
+def is_not_modified(request_headers, etag=None, last_modified=None):
+    """
+    Whether the client's cached copy is still current. If-None-Match takes
+    precedence; If-Modified-Since is only used when it is absent.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and int(last_modified) <= since
+    return False
+
+
+def validator_headers(etag=None, last_modified=None, cache_control=CATALOG_CACHE_CONTROL):
+    headers = {"Cache-Control": cache_control}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(headers):
+    """Empty 304 carrying the same validators and caching headers a 200 would"""
+    return Response(status_code=304, headers=headers)
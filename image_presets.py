@@ -0,0 +1,78 @@
+"""
+Named image presets for product images.
+
+Each preset names a source image column and a Cloudinary transformation.
+The transformed URL of every preset is computed once, when a product's
+images are written, and stored in ``product_image_variants``; the read
+path only joins the row for the preset it wants. Images that are not on
+Cloudinary can't be transformed, so their presets point at the stored
+source image as is.
+
+Clients pick a preset with ``image_preset=`` on ``/products/`` (default
+``grid``), ``/products/{id}`` and ``/products/batch``. The category, filter
+and search endpoints serve the in-memory sample catalog, which has no
+stored variants, so presets do not apply there.
+"""
+
+import logging
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+CREATE_PRODUCT_IMAGE_VARIANTS_TABLE = """
+CREATE TABLE IF NOT EXISTS product_image_variants (
+    product_id BIGINT UNSIGNED NOT NULL,
+    preset VARCHAR(32) NOT NULL,
+    url VARCHAR(1000) NOT NULL,
+    PRIMARY KEY (product_id, preset)
+) ENGINE=InnoDB;
+"""
+
+# preset: (source column, Cloudinary transformation)
+IMAGE_PRESETS = {
+    "grid": ("image_thumb_url", "w_300,h_300,c_fill,q_auto:low,f_auto"),  # storefront product grid
+    "thumb": ("image_thumb_url", "w_200,h_200,c_fill,q_auto,f_auto"),
+    "card": ("image_main_url", "w_600,h_400,c_fill,q_auto,f_auto"),
+    "zoom": ("image_full_url", "w_1600,c_limit,q_auto:good,f_auto"),
+}
+DEFAULT_LIST_PRESET = "grid"
+
+IMAGE_COLUMNS = ("image_full_url", "image_main_url", "image_thumb_url")
+
+
+def transform_url(url, transformation):
+    """Insert a Cloudinary transformation into ``url``; other URLs are returned unchanged"""
+    if 'cloudinary.com' in url and '/upload/' in url:
+        return url.replace('/upload/', f'/upload/{transformation}/', 1)
+    return url
+
+
+def image_variants(images):
+    """``{preset: url}`` for a product's image columns; presets without a source image are left out"""
+    variants = {}
+    for preset, (column, transformation) in IMAGE_PRESETS.items():
+        if images.get(column):
+            variants[preset] = transform_url(images[column], transformation)
+    return variants
+
+
+def save_image_variants(cursor, product_id, images):
+    """
+    Replace a product's stored variants, inside the caller's transaction.
+    Skipped (readers fall back to the stored images) when the table has not
+    been migrated yet.
+    """
+    try:
+        cursor.execute("DELETE FROM product_image_variants WHERE product_id = %s", (product_id,))
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+            raise
+        logger.warning("product_image_variants table is missing; run 'python migrations.py migrate'")
+        return
+    variants = image_variants(images)
+    if variants:
+        cursor.executemany(
+            "INSERT INTO product_image_variants (product_id, preset, url) VALUES (%s, %s, %s)",
+            [(product_id, preset, url) for preset, url in variants.items()]
+        )
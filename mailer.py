@@ -0,0 +1,198 @@
+"""
+Persistent SMTP transport for outgoing email.
+
+Opening an SMTP session means TCP connect + EHLO + STARTTLS + AUTH, which
+against smtp.gmail.com costs far more than sending the message itself. The
+transport keeps one authenticated session open, sends every message through
+it, and transparently reconnects when the server drops the connection.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _is_connection_error(error):
+    """True when the session is unusable and a fresh connection may succeed"""
+    import smtplib
+
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # service closing transmission channel
+    # SMTPException subclasses OSError, so exclude protocol-level refusals
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPTransport:
+    """
+    Thread-safe SMTP client that reuses one authenticated connection.
+
+    - The session is reopened after ``idle_timeout`` seconds without traffic
+      (servers drop idle clients anyway) or after ``max_messages_per_connection``.
+    - A send that fails because the connection dropped (or the server answered
+      421) is retried once on a new connection. Other failures, such as a
+      refused recipient, are raised without tearing the session down.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 timeout=30, idle_timeout=60, max_messages_per_connection=100):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_messages_per_connection = max_messages_per_connection
+
+        # Held for whole SMTP exchanges; counters have their own short-lived lock
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._server = None
+        self._last_used_at = 0.0
+        self._messages_on_connection = 0
+
+        # Monitoring counters
+        self._connections_opened = 0
+        self._reconnects = 0
+        self._messages_sent = 0
+        self._failures = 0
+        self._send_seconds = 0.0
+
+    # Connection handling (called with the lock held)
+
+    def _open(self):
+        # smtplib (and the email package it pulls in) is imported on first send so
+        # processes that never send mail do not pay for it at startup
+        import smtplib
+
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._messages_on_connection = 0
+        with self._stats_lock:
+            self._connections_opened += 1
+        logger.info(f"SMTP session opened to {self.host}:{self.port}")
+
+    def _close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _discard(self):
+        """Drop a broken session without talking to the server"""
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+
+    def _ensure_connection(self):
+        if self._server is not None:
+            idle = time.monotonic() - self._last_used_at
+            if idle >= self.idle_timeout or self._messages_on_connection >= self.max_messages_per_connection:
+                self._close()
+        if self._server is None:
+            self._open()
+
+    def _send_locked(self, from_addr, to_addrs, message):
+        for attempt in (1, 2):
+            self._ensure_connection()
+            try:
+                self._server.sendmail(from_addr, to_addrs, message)
+                break
+            except Exception as e:
+                if not _is_connection_error(e):
+                    raise  # e.g. recipient refused: the session itself is still fine
+                self._discard()
+                if attempt == 2:
+                    raise
+                logger.warning(f"SMTP connection lost ({e}), reconnecting")
+                with self._stats_lock:
+                    self._reconnects += 1
+        self._messages_on_connection += 1
+        self._last_used_at = time.monotonic()
+
+    # Public API
+
+    def send(self, from_addr, to_addrs, message):
+        """Send one message (a string or bytes with headers) over the shared session"""
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                self._send_locked(from_addr, to_addrs, message)
+                with self._stats_lock:
+                    self._messages_sent += 1
+            except Exception:
+                with self._stats_lock:
+                    self._failures += 1
+                raise
+            finally:
+                with self._stats_lock:
+                    self._send_seconds += time.perf_counter() - started
+
+    def send_many(self, messages):
+        """
+        Send ``(from_addr, to_addrs, message)`` tuples back to back on one
+        session. Returns one entry per message: ``None`` on success or the
+        exception that made that message fail.
+        """
+        results = []
+        with self._lock:
+            started = time.perf_counter()
+            for from_addr, to_addrs, message in messages:
+                try:
+                    self._send_locked(from_addr, to_addrs, message)
+                    with self._stats_lock:
+                        self._messages_sent += 1
+                    results.append(None)
+                except Exception as e:
+                    with self._stats_lock:
+                        self._failures += 1
+                    results.append(e)
+            with self._stats_lock:
+                self._send_seconds += time.perf_counter() - started
+        return results
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def stats(self):
+        """Counters only: never waits for a send in progress"""
+        with self._stats_lock:
+            return {
+                "connected": self._server is not None,
+                "connections_opened": self._connections_opened,
+                "reconnects": self._reconnects,
+                "messages_sent": self._messages_sent,
+                "failures": self._failures,
+                "messages_per_second": round(self._messages_sent / self._send_seconds, 2) if self._send_seconds else None,
+            }
+
+
+def transport_from_env():
+    """SMTP transport configured from EMAIL_USER / EMAIL_PASS and SMTP_* variables"""
+    return SMTPTransport(
+        host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        port=int(os.getenv("SMTP_PORT", 587)),
+        username=os.getenv("EMAIL_USER"),
+        password=os.getenv("EMAIL_PASS"),
+        use_tls=os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes"),
+        idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT", 60)),
+    )
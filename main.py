@@ -1,28 +1,38 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, status
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 import os
 import uuid
 import json
+import mimetypes
 from datetime import datetime
-from PIL import Image
 import shutil
 import pymysql
 from pymysql import Error
 from dotenv import load_dotenv
 import logging
 from contextlib import contextmanager
-import bcrypt
-import jwt
 from datetime import datetime, timedelta
 from functools import lru_cache
 from datetime import datetime, timedelta
+from mailer import transport_from_env
+from email_outbox import EmailOutboxWorker, enqueue_email
+from migrations import check_schema_version
+from catalog_cache import CatalogVersion, LRUCache, SWRCache, bump_catalog_version
+from compression import CompressionMiddleware, EncodedBody, encoded_file, is_compressible
+from fast_json import TRUSTED_OUTPUT, FastJSONResponse, dumps, trusted_response
+from product_events import ProductEventBroker, record_product_events
+from image_presets import DEFAULT_LIST_PRESET, IMAGE_COLUMNS, IMAGE_PRESETS, save_image_variants
+from http_cache import CATALOG_CACHE_CONTROL, is_not_modified, make_etag, not_modified, validator_headers
+from database import (
+    ConnectionPool, DatabaseExecutor, DatabaseRouter, PoolTimeout, ReplicaReadError,
+    TransactionRetrier, UnitOfWork, is_retryable_error, parse_database_url, pool_settings_from_env
+)
 
 
 # Load environment variables from .env file
@@ -43,13 +53,33 @@ DB_CONFIG = {
     'write_timeout': 10
 }
 
+# Whether the environment provides database credentials at all
+DATABASE_CONFIGURED = all([os.getenv('host_name'), os.getenv('db_username'), os.getenv('db_password'), os.getenv('database_name')])
+
+# Optional read replicas, e.g. db_replica_urls=mysql://reader:pw@replica-1:3306/shop,mysql://...
+# Unspecified settings (credentials, database, timeouts) are inherited from DB_CONFIG.
+DB_REPLICA_CONFIGS = [
+    {**DB_CONFIG, **parse_database_url(url)}
+    for url in os.getenv('db_replica_urls', '').split(',') if url.strip()
+]
+
+# Stock reservation strategy for checkout:
+# - "pessimistic": lock product rows with SELECT ... FOR UPDATE before writing the order
+# - "optimistic": write the order first, then claim stock with a conditional UPDATE
+#   (quantity >= n) as the last statement before commit, rolling back if any line fails;
+#   product rows are locked only from that UPDATE until the commit
+ORDER_STOCK_MODE = os.getenv('ORDER_STOCK_MODE', 'pessimistic').lower()
+if ORDER_STOCK_MODE not in ('pessimistic', 'optimistic'):
+    ORDER_STOCK_MODE = 'pessimistic'
+
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES =  60 * 24 * 365 * 100
 
 # Initialize FastAPI app
-app = FastAPI(title="Trendyoft E-commerce Backend", version="1.0.0")
+# Handlers that build their own output return trusted_response(...) to skip re-validation
+app = FastAPI(title="Trendyoft E-commerce Backend", version="1.0.0", default_response_class=FastJSONResponse)
 
 # Setup logging (console only for serverless)
 logging.basicConfig(
@@ -61,223 +91,64 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Shared connection pools (DB_POOL_MIN_SIZE connections are opened at startup, the rest on demand)
+db_pool = ConnectionPool(DB_CONFIG, **pool_settings_from_env())
+db_router = DatabaseRouter(
+    db_pool,
+    [ConnectionPool(config, **pool_settings_from_env()) for config in DB_REPLICA_CONFIGS],
+    pin_seconds=float(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+)
+
+# Read-your-writes pin keys: catalog reads after admin writes, order history per user
+CATALOG_PIN_KEY = "catalog"
+
+def orders_pin_key(user_email: str):
+    return f"orders:{user_email}"
+
+# Checkout transactions are retried on deadlock / lock wait timeout
+order_retrier = TransactionRetrier(
+    max_attempts=int(os.getenv('ORDER_TX_MAX_ATTEMPTS', 3)),
+    base_delay=float(os.getenv('ORDER_TX_RETRY_BASE_DELAY', 0.05))
+)
+
+# Blocking pymysql calls made from async routes run here instead of on the event loop.
+# Every task releases its connection before it returns (see DatabaseExecutor).
+db_executor = DatabaseExecutor(max_workers=db_pool.max_size)
+
+async def run_db(func, *args, **kwargs):
+    """Await a blocking database helper without stalling the event loop"""
+    return await db_executor.run(func, *args, **kwargs)
+
 # Database connection management
 @contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    connection = None
+def get_db_connection(read_only: bool = False, pin_key: Optional[str] = None):
+    """
+    Context manager for database connections drawn from the shared pools.
+
+    Pass ``read_only=True`` for pure reads so they can be served by a replica;
+    reads whose ``pin_key`` was recently written go to the primary instead.
+    """
     try:
-        connection = pymysql.connect(**DB_CONFIG)
-        logger.info("Database connection established")
-        yield connection
+        # The pool rolls back any transaction left open when the connection is returned
+        with db_router.connection(read_only=read_only, pin_key=pin_key) as connection:
+            yield connection
+    except PoolTimeout as e:
+        logger.error(f"Database pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail="Database is busy, please try again shortly")
+    except ReplicaReadError:
+        raise  # read helpers decorated with db_router.fallback_to_primary retry on the primary
     except Error as e:
         logger.error(f"Database connection error: {e}")
-        if connection:
-            try:
-                connection.rollback()
-            except:
-                pass
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if connection:
-            try:
-                connection.close()
-                logger.info("Database connection closed")
-            except:
-                logger.warning("Error closing database connection")
-
-# Database initialization
-def init_database():
-    """Initialize database tables with proper schema and foreign keys"""
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Create customers table
-            create_customers_table = """
-            CREATE TABLE IF NOT EXISTS customers (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                first_name VARCHAR(100) NOT NULL,
-                last_name VARCHAR(100) NOT NULL,
-                phone_number VARCHAR(20) UNIQUE,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_email (email),
-                INDEX idx_phone (phone_number)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Create products table
-            create_products_table = """
-            CREATE TABLE IF NOT EXISTS products (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                description TEXT,
-                price DECIMAL(15, 2) NOT NULL,
-                quantity INT NOT NULL DEFAULT 0,
-                category VARCHAR(100) NOT NULL,
-                image_full_url VARCHAR(500),
-                image_main_url VARCHAR(500),
-                image_thumb_url VARCHAR(500),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE,
-                INDEX idx_category (category),
-                INDEX idx_title (title),
-                INDEX idx_is_active (is_active)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Create shipping_addresses table
-            create_shipping_addresses_table = """
-            CREATE TABLE IF NOT EXISTS shipping_addresses (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                customer_id BIGINT UNSIGNED NOT NULL,
-                address_line1 VARCHAR(255) NOT NULL,
-                address_line2 VARCHAR(255),
-                city VARCHAR(100) NOT NULL,
-                country VARCHAR(100) NOT NULL,
-                zip_code VARCHAR(20) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
-                INDEX idx_customer_id (customer_id)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Create orders table
-            create_orders_table = """
-            CREATE TABLE IF NOT EXISTS orders (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                customer_id BIGINT UNSIGNED NOT NULL,
-                shipping_address_id BIGINT UNSIGNED NOT NULL,
-                status ENUM('pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled') DEFAULT 'pending',
-                total_amount DECIMAL(15, 2) NOT NULL,
-                order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
-                FOREIGN KEY (shipping_address_id) REFERENCES shipping_addresses(id) ON DELETE RESTRICT,
-                INDEX idx_customer_id (customer_id),
-                INDEX idx_status (status),
-                INDEX idx_order_date (order_date)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Create payment_details table
-            create_payment_details_table = """
-            CREATE TABLE IF NOT EXISTS payment_details (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                order_id BIGINT UNSIGNED NOT NULL,
-                payment_provider VARCHAR(50) NOT NULL,
-                payment_id VARCHAR(255) NOT NULL,
-                status ENUM('pending', 'completed', 'failed', 'refunded') DEFAULT 'pending',
-                currency VARCHAR(3) DEFAULT 'USD',
-                amount DECIMAL(10, 2) NOT NULL,
-                payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
-                INDEX idx_order_id (order_id),
-                INDEX idx_payment_id (payment_id),
-                INDEX idx_status (status)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Create users table for authentication
-            create_users_table = """
-            CREATE TABLE IF NOT EXISTS users (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                username VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_email (email)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Drop and recreate order_items table to fix foreign key constraint issues
-            drop_order_items_table = "DROP TABLE IF EXISTS order_items;"
-            
-            # Create order_items table (junction table for orders and products)
-            create_order_items_table = """
-            CREATE TABLE IF NOT EXISTS order_items (
-                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
-                order_id BIGINT UNSIGNED NOT NULL,
-                product_id BIGINT UNSIGNED NOT NULL,
-                quantity INT NOT NULL,
-                price DECIMAL(10, 2) NOT NULL,
-                INDEX idx_order_id (order_id),
-                INDEX idx_product_id (product_id)
-            ) ENGINE=InnoDB;
-            """
-            
-            # Execute table creation queries in correct order for foreign keys
-            tables = [
-                ("customers", create_customers_table),
-                ("products", create_products_table),
-                ("shipping_addresses", create_shipping_addresses_table),
-                ("orders", create_orders_table),
-                ("payment_details", create_payment_details_table),
-                ("users", create_users_table)
-            ]
-            
-            for table_name, query in tables:
-                cursor.execute(query)
-                logger.info(f"Table {table_name} created/verified successfully")
-            
-            # Create order_items table without foreign keys first
-            cursor.execute(create_order_items_table)
-            logger.info("Table order_items created/verified successfully")
-            
-            # Add foreign key constraints after all tables are created
-            try:
-                cursor.execute("""
-                    ALTER TABLE order_items 
-                    ADD CONSTRAINT fk_order_items_order_id 
-                    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
-                """)
-                logger.info("Foreign key constraint for order_items.order_id added successfully")
-            except Exception as e:
-                logger.warning(f"Foreign key constraint for order_items.order_id already exists or failed: {e}")
-            
-            try:
-                cursor.execute("""
-                    ALTER TABLE order_items 
-                    ADD CONSTRAINT fk_order_items_product_id 
-                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE RESTRICT
-                """)
-                logger.info("Foreign key constraint for order_items.product_id added successfully")
-            except Exception as e:
-                logger.warning(f"Foreign key constraint for order_items.product_id already exists or failed: {e}")
-            
-            # Update existing table schemas if needed
-            try:
-                cursor.execute("ALTER TABLE orders MODIFY COLUMN total_amount DECIMAL(15, 2) NOT NULL")
-                logger.info("Updated orders table total_amount column size")
-            except Exception as e:
-                logger.warning(f"Orders table total_amount column already updated or failed: {e}")
-            
-            # Add username column to customers table if it doesn't exist
-            try:
-                cursor.execute("ALTER TABLE customers ADD COLUMN username VARCHAR(100) AFTER last_name")
-                logger.info("Added username column to customers table")
-            except Exception as e:
-                logger.warning(f"Username column already exists in customers table or failed: {e}")
-                
-            conn.commit()
-            logger.info("Database initialization completed successfully")
-            
-    except Error as e:
-        logger.error(f"Error initializing database: {e}")
-        raise
 
-# Initialize database on startup (with better error handling for serverless)
-try:
-    # Only initialize database if we have all required environment variables
-    if all([os.getenv('host_name'), os.getenv('db_username'), os.getenv('db_password'), os.getenv('database_name')]):
-        init_database()
-        logger.info("Database initialized successfully")
+@contextmanager
+def use_db_connection(conn=None, **kwargs):
+    """Yield ``conn`` when the caller already holds one, otherwise check one out"""
+    if conn is not None:
+        yield conn
     else:
-        logger.warning("Database environment variables not found - running without database")
-except Exception as e:
-    logger.error(f"Failed to initialize database: {e}")
-    # Don't crash the app if database initialization fails
+        with get_db_connection(**kwargs) as connection:
+            yield connection
 
 # CORS middleware to allow frontend access
 app.add_middleware(
@@ -292,29 +163,79 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag", "Last-Modified"],
 )
 
-# Cache products for 5 minutes
-products_cache = None
-products_cache_time = None
+# gzip / brotli for dynamic responses; cached ones arrive already encoded
+app.add_middleware(CompressionMiddleware)
+
+# Cache products for 5 minutes, or until any worker changes the catalog. After
+# that the last list keeps being served while one request refreshes it, and
+# for up to an hour if the database is failing.
 CACHE_DURATION = 300  # 5 minutes in seconds
+products_cache = SWRCache(
+    ttl=CACHE_DURATION,
+    stale_while_revalidate=float(os.getenv('PRODUCTS_CACHE_STALE_WHILE_REVALIDATE', 300)),
+    stale_if_error=float(os.getenv('PRODUCTS_CACHE_STALE_IF_ERROR', 3600)),
+    name="products"
+)
+
+# Single product rows for detail pages, per worker. Product writes and orders
+# in this worker invalidate their products; product writes elsewhere change
+# the catalog version, orders elsewhere arrive as product events or expire.
+product_cache = LRUCache(
+    max_entries=int(os.getenv('PRODUCT_CACHE_MAX_ENTRIES', 1024)),
+    ttl=float(os.getenv('PRODUCT_CACHE_TTL', 30)),
+    name="product"
+)
+
+def on_catalog_change(old_version, new_version):
+    """A product write was seen: read the catalog from the primary until replicas catch up"""
+    logger.info(f"Catalog changed (version {old_version} -> {new_version})")
+    db_router.pin_primary(CATALOG_PIN_KEY)
+
+catalog_version = CatalogVersion(get_db_connection, run_db, on_change=on_catalog_change)
+
+def on_product_event(event):
+    """Another worker (or an order) changed a product: drop its cached row"""
+    product_cache.invalidate(event['product_id'])
+
+# One poller per worker fans product changes out to /products/events streams
+product_events = ProductEventBroker(get_db_connection, run_db, on_event=on_product_event)
 
-# Create images directory structure in /tmp if it doesn't exist
+def schedule_event_pruning():
+    """
+    Prune old product events in an executor task of its own: the caller
+    still holds its connection, and pruning needs another one.
+    """
+    if product_events.prune_due():
+        db_executor.submit(product_events.prune_if_due)
+
+def commit_catalog_change(conn, cursor):
+    """Commit a product write together with a catalog version bump"""
+    version = bump_catalog_version(cursor)
+    conn.commit()
+    db_router.pin_primary(CATALOG_PIN_KEY)
+    catalog_version.observe(version)
+    product_events.wake()
+    schedule_event_pruning()
+
+# Images directory structure in /tmp, created on the first upload
 IMAGES_DIR = "/tmp/images"
 THUMBNAIL_DIR = os.path.join(IMAGES_DIR, "thumbnails")
 MAIN_DIR = os.path.join(IMAGES_DIR, "main")
 ORIGINAL_DIR = os.path.join(IMAGES_DIR, "original")
 
-# Create directories
-for directory in [IMAGES_DIR, THUMBNAIL_DIR, MAIN_DIR, ORIGINAL_DIR]:
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+@lru_cache(maxsize=None)
+def ensure_image_dirs():
+    for directory in [IMAGES_DIR, THUMBNAIL_DIR, MAIN_DIR, ORIGINAL_DIR]:
+        os.makedirs(directory, exist_ok=True)
 
-# Mount static files for serving images from /tmp
-app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
+# Mount static files for serving images from /tmp (404s until something is uploaded)
+app.mount("/images", StaticFiles(directory=IMAGES_DIR, check_dir=False), name="images")
 
-# Mount static files for serving the website
-app.mount("/static", StaticFiles(directory="."), name="static")
+# The website's own files under /static are served by serve_static below
+STATIC_DIR = os.path.realpath(".")
 
 # Admin token for protected operations
 ADMIN_TOKEN = "danishshaikh@06"  # Change this to your actual admin token
@@ -323,89 +244,239 @@ ADMIN_TOKEN = "danishshaikh@06"  # Change this to your actual admin token
 security = HTTPBearer()
 
 # Database helper functions
-def get_products_from_db():
-    """Fetch all products from database - OPTIMIZED FOR SPEED"""
-    with get_db_connection() as conn:
+# Product listing pages (keyset pagination: the cursor is the last id seen)
+PRODUCTS_PAGE_SIZE = 50
+PRODUCTS_MAX_PAGE_SIZE = 100
+
+# Sparse fieldsets (?fields=id,title,price,thumb,stock_status): the columns
+# each response field is built from, so unrequested columns are never read
+PRODUCT_FIELD_COLUMNS = {
+    'id': ('id',),
+    'title': ('title',),
+    'price': ('price',),
+    'description': ('description',),
+    'quantity': ('quantity',),
+    'category': ('category',),
+    'image_url': ('image_main_url',),
+    'thumb': ('image_thumb_url',),
+    'images': ('image_thumb_url', 'image_main_url', 'image_full_url'),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+    'is_active': ('is_active',),
+    'stock_status': ('quantity',),
+}
+PRODUCT_LIST_COLUMNS = ('id', 'title', 'price', 'quantity', 'category', 'image_thumb_url', 'is_active')
+PRODUCT_DETAIL_COLUMNS = ('id', 'title', 'description', 'price', 'quantity', 'category',
+                          'image_full_url', 'image_main_url', 'image_thumb_url',
+                          'created_at', 'updated_at', 'is_active')
+
+def parse_product_fields(fields: Optional[str]):
+    """Validate a ``fields=`` parameter; returns the fields in canonical order, or None for all"""
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - PRODUCT_FIELD_COLUMNS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s): {', '.join(sorted(unknown))}. "
+                   f"Available: {', '.join(PRODUCT_FIELD_COLUMNS)}"
+        )
+    requested.add('id')  # always sent; the list cursor is built from it
+    return tuple(name for name in PRODUCT_FIELD_COLUMNS if name in requested)
+
+def product_columns(fields):
+    """SQL columns needed to build ``fields``"""
+    columns = []
+    for field in fields:
+        for column in PRODUCT_FIELD_COLUMNS[field]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+def format_product_fields(product, fields):
+    """Build only the requested response fields from a product row"""
+    formatted = {}
+    for field in fields:
+        if field == 'price':
+            formatted[field] = float(product['price'])
+        elif field == 'image_url':
+            formatted[field] = product.get('image_main_url') or ''
+        elif field == 'thumb':
+            formatted[field] = product.get('image_thumb_url') or ''
+        elif field == 'images':
+            formatted[field] = {
+                'thumbnail': product.get('image_thumb_url') or '',
+                'main': product.get('image_main_url') or '',
+                'original': product.get('image_full_url') or ''
+            }
+        elif field in ('created_at', 'updated_at'):
+            formatted[field] = product[field].isoformat() if product.get(field) else None
+        elif field == 'is_active':
+            formatted[field] = bool(product['is_active'])
+        elif field == 'stock_status':
+            formatted[field] = 'In Stock' if product['quantity'] > 0 else 'Out of Stock'
+        else:
+            formatted[field] = product[field]
+    return formatted
+
+def format_product(product):
+    """Full ProductResponse-shaped dict for a product detail row"""
+    # Handle NULL image values by providing empty strings as fallback
+    image_main = product.get('image_main_url') or ''
+    image_thumb = product.get('image_thumb_url') or ''
+    image_full = product.get('image_full_url') or ''
+    
+    return {
+        'id': product['id'],
+        'title': product['title'],
+        'price': float(product['price']),
+        'description': product['description'],
+        'quantity': product['quantity'],
+        'category': product['category'],
+        'image_url': image_main,  # Backward compatibility
+        'images': {
+            'thumbnail': image_thumb,
+            'main': image_main,
+            'original': image_full
+        },
+        'created_at': product['created_at'].isoformat() if product.get('created_at') else '',
+        'updated_at': product['updated_at'].isoformat() if product.get('updated_at') else None,
+        'is_active': bool(product['is_active']),
+        'stock_status': 'In Stock' if product.get('quantity', 0) > 0 else 'Out of Stock'
+    }
+
+def check_image_preset(image_preset: Optional[str]):
+    """400 for an unknown ``image_preset=`` value"""
+    if image_preset is not None and image_preset not in IMAGE_PRESETS:
+        raise HTTPException(status_code=400, detail=f"Unknown image preset. Available: {', '.join(IMAGE_PRESETS)}")
+
+@db_router.fallback_to_primary
+def get_image_preset_urls(product_ids, image_preset: str):
+    """``{product_id: url}`` of the precomputed ``image_preset`` URLs; products without one are left out"""
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    with get_db_connection(read_only=True, pin_key=CATALOG_PIN_KEY) as conn:
         cursor = conn.cursor()
-        # Fetch minimal data with optimized images
-        cursor.execute("""
-            SELECT 
-                id, 
-                title, 
-                price, 
-                quantity, 
-                category, 
-                image_thumb_url,
-                is_active 
-            FROM products 
-            WHERE is_active = TRUE 
-            ORDER BY id DESC
-            LIMIT 50
-        """)
+        try:
+            cursor.execute(f"""
+                SELECT product_id, url FROM product_image_variants
+                WHERE preset = %s AND product_id IN ({placeholders})
+            """, [image_preset] + list(product_ids))
+        except pymysql.err.ProgrammingError as e:
+            if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+                raise
+            logger.warning("product_image_variants table is missing; run 'python migrations.py migrate'")
+            return {}
+        return {row['product_id']: row['url'] for row in cursor.fetchall()}
+
+def apply_image_preset(product, url):
+    """Point every image field of a formatted product at one preset URL, like the list does"""
+    if 'image_url' in product:
+        product['image_url'] = url
+    if 'thumb' in product:
+        product['thumb'] = url
+    if 'images' in product:
+        product['images'] = {'thumbnail': url, 'main': url, 'original': url}
+    return product
+
+@db_router.fallback_to_primary
+def get_products_from_db(after_id: Optional[int] = None, limit: int = PRODUCTS_PAGE_SIZE,
+                         columns=PRODUCT_LIST_COLUMNS, image_preset: str = DEFAULT_LIST_PRESET):
+    """Fetch one page of active products, newest first - OPTIMIZED FOR SPEED
+    
+    Seeks on the (is_active, id) index instead of OFFSET, so every page costs
+    the same however deep it is. Returns (products, next_cursor); next_cursor
+    is None on the last page. ``columns`` must come from PRODUCT_FIELD_COLUMNS.
+    
+    ``image_thumb_url`` is the ``image_preset`` URL precomputed at write time
+    (falling back to the stored thumbnail, also while
+    ``product_image_variants`` has not been migrated yet), so no URLs are
+    rewritten here.
+    """
+    select = [
+        "COALESCE(v.url, p.image_thumb_url) AS image_thumb_url" if column == 'image_thumb_url' else f"p.{column}"
+        for column in columns
+    ]
+    page = """
+        WHERE p.is_active = TRUE AND p.id < %s
+        ORDER BY p.id DESC
+        LIMIT %s
+    """
+    page_params = (after_id if after_id is not None else 2 ** 64 - 1, limit + 1)
+    with get_db_connection(read_only=True, pin_key=CATALOG_PIN_KEY) as conn:
+        cursor = conn.cursor()
+        # Fetch minimal data with optimized images, one extra row to detect a next page
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(select)}
+                FROM products p
+                LEFT JOIN product_image_variants v ON v.product_id = p.id AND v.preset = %s
+                {page}
+            """, (image_preset, *page_params))
+        except pymysql.err.ProgrammingError as e:
+            if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+                raise
+            logger.warning("product_image_variants table is missing; run 'python migrations.py migrate'")
+            cursor.execute(f"""
+                SELECT {', '.join(f"p.{column}" for column in columns)}
+                FROM products p
+                {page}
+            """, page_params)
         products = cursor.fetchall()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = products[-1]['id']
         
-        # Add optimized image URLs
-        for product in products:
-            if product.get('image_thumb_url'):
-                # Optimize Cloudinary URLs
-                thumb_url = product['image_thumb_url']
-                if 'cloudinary.com' in thumb_url and '/upload/' in thumb_url:
-                    # Add transformation parameters for smaller, optimized images
-                    product['image_thumb_url'] = thumb_url.replace(
-                        '/upload/', 
-                        '/upload/w_300,h_300,c_fill,q_auto:low,f_auto/'
-                    )
-        
-        return products
+        return products, next_cursor
 
-def optimize_database():
-    """Add indexes for faster queries"""
-    try:
-        with get_db_connection() as conn:
+@db_router.fallback_to_primary
+def get_products_by_ids(product_ids, columns=PRODUCT_DETAIL_COLUMNS):
+    """Fetch active products by ID, from the per-product cache when possible
+    
+    Cache misses are read with a single ``WHERE id IN (...)`` query. Returns
+    ``{id: product}`` for the products found, each a new dict with
+    ``columns`` plus ``modified_at``. Whole rows are cached: a primary key
+    lookup reads the whole row anyway.
+    """
+    version = catalog_version.version
+    rows = {}
+    missing = []
+    for product_id in product_ids:
+        row = product_cache.get(product_id, version)
+        if row is None:
+            missing.append(product_id)
+        else:
+            rows[product_id] = row
+    
+    if missing:
+        generation = product_cache.generation
+        placeholders = ", ".join(["%s"] * len(missing))
+        with get_db_connection(read_only=True, pin_key=CATALOG_PIN_KEY) as conn:
             cursor = conn.cursor()
-            
-            # Add indexes if they don't exist
-            try:
-                cursor.execute("CREATE INDEX idx_products_active ON products(is_active)")
-                logger.info("Created index on is_active")
-            except:
-                pass
-            
-            try:
-                cursor.execute("CREATE INDEX idx_products_category_active ON products(category, is_active)")
-                logger.info("Created index on category and is_active")
-            except:
-                pass
-                
-            conn.commit()
-    except Exception as e:
-        logger.warning(f"Could not optimize database: {e}")
-
-# Call this after init_database()
-try:
-    init_database()
-    optimize_database()  # ADD THIS LINE
-    logger.info("Database initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize database: {e}")
-
-def get_product_by_id(product_id: int):
-    """Fetch a single product by ID from database"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, title, description, price, quantity, category, 
-                   image_full_url, image_main_url, image_thumb_url, 
-                   created_at, updated_at, is_active 
-            FROM products 
-            WHERE id = %s AND is_active = TRUE
-        """, (product_id,))
-        return cursor.fetchone()
+            cursor.execute(f"""
+                SELECT {', '.join(PRODUCT_DETAIL_COLUMNS)}, UNIX_TIMESTAMP(updated_at) AS modified_at
+                FROM products 
+                WHERE id IN ({placeholders}) AND is_active = TRUE
+            """, missing)
+            for row in cursor.fetchall():
+                rows[row['id']] = row
+                product_cache.put(row['id'], row, version, generation)
+    
+    return {
+        product_id: {column: row[column] for column in (*columns, 'modified_at')}
+        for product_id, row in rows.items()
+    }
+
+def get_product_by_id(product_id: int, columns=PRODUCT_DETAIL_COLUMNS):
+    """Fetch a single active product by ID (see ``get_products_by_ids``)"""
+    return get_products_by_ids([product_id], columns).get(product_id)
 
 def insert_product_to_db(product_data):
     """Insert a new product into database"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        conn.begin()
         insert_query = """
             INSERT INTO products (title, description, price, quantity, category, 
                                 image_full_url, image_main_url, image_thumb_url) 
@@ -421,8 +492,11 @@ def insert_product_to_db(product_data):
             product_data['image_main_url'],
             product_data['image_thumb_url']
         ))
-        conn.commit()
-        return cursor.lastrowid
+        product_id = cursor.lastrowid
+        save_image_variants(cursor, product_id, product_data)
+        record_product_events(cursor, 'created', [product_id])
+        commit_catalog_change(conn, cursor)
+        return product_id
 
 def update_product_in_db(product_id: int, product_data):
     """Update a product in database"""
@@ -441,22 +515,37 @@ def update_product_in_db(product_id: int, product_data):
         if update_fields:
             values.append(product_id)
             update_query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s"
+            conn.begin()
             cursor.execute(update_query, values)
-            conn.commit()
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+            if any(product_data.get(column) is not None for column in IMAGE_COLUMNS):
+                # Recompute the image presets from the images as stored now
+                cursor.execute(f"SELECT {', '.join(IMAGE_COLUMNS)} FROM products WHERE id = %s", (product_id,))
+                images = cursor.fetchone()
+                if images:
+                    save_image_variants(cursor, product_id, images)
+            record_product_events(cursor, 'updated', [product_id])
+            commit_catalog_change(conn, cursor)
+            product_cache.invalidate(product_id)
+            return updated
         return False
 
 def delete_product_from_db(product_id: int):
     """Soft delete a product (set is_active = FALSE)"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        conn.begin()
         cursor.execute("UPDATE products SET is_active = FALSE WHERE id = %s", (product_id,))
-        conn.commit()
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+        record_product_events(cursor, 'deleted', [product_id])
+        commit_catalog_change(conn, cursor)
+        product_cache.invalidate(product_id)
+        return deleted
 
+@db_router.fallback_to_primary
 def get_categories_from_db():
     """Get category statistics from database - OPTIMIZED"""
-    with get_db_connection() as conn:
+    with get_db_connection(read_only=True, pin_key=CATALOG_PIN_KEY) as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT category, 
@@ -478,10 +567,10 @@ def get_categories_from_db():
         return formatted_categories
 
 # Customer management functions
-def insert_customer_to_db(customer_data):
-    """Insert a new customer into database"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+def insert_customer_to_db(customer_data, conn=None):
+    """Insert a new customer into database (inside ``conn``'s transaction when given)"""
+    with use_db_connection(conn) as db:
+        cursor = db.cursor()
         insert_query = """
             INSERT INTO customers (first_name, last_name, phone_number, email) 
             VALUES (%s, %s, %s, %s)
@@ -492,13 +581,14 @@ def insert_customer_to_db(customer_data):
             customer_data.get('phone_number'),
             customer_data['email']
         ))
-        conn.commit()
+        if conn is None:
+            db.commit()
         return cursor.lastrowid
 
-def get_customer_by_email(email: str):
+def get_customer_by_email(email: str, conn=None):
     """Get customer by email"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    with use_db_connection(conn) as db:
+        cursor = db.cursor()
         cursor.execute("SELECT * FROM customers WHERE email = %s", (email,))
         return cursor.fetchone()
 
@@ -519,11 +609,36 @@ def update_customer_in_db(customer_id: int, customer_data):
         conn.commit()
         return cursor.rowcount > 0
 
+def insert_shipping_address_to_db(customer_id: int, address_data, conn=None):
+    """Insert a shipping address for a customer (inside ``conn``'s transaction when given)"""
+    with use_db_connection(conn) as db:
+        cursor = db.cursor()
+        cursor.execute(
+            "INSERT INTO shipping_addresses (customer_id, address_line1, address_line2, city, country, zip_code) VALUES (%s, %s, %s, %s, %s, %s)",
+            (
+                customer_id,
+                address_data['address_line1'],
+                address_data['address_line2'],
+                address_data['city'],
+                address_data['country'],
+                address_data['zip_code']
+            )
+        )
+        if conn is None:
+            db.commit()
+        return cursor.lastrowid
+
 # Order management functions
-def send_email(subject, body, to_email, customer_name=None):
-    """Send an email notification with improved deliverability"""
+
+# One SMTP session is kept open and reused for every email sent by this process
+mail_transport = transport_from_env()
+
+def deliver_email(subject, body, to_email, customer_name=None):
+    """Send an email notification with improved deliverability (raises on failure)"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     from_email = os.getenv('EMAIL_USER')
-    email_password = os.getenv('EMAIL_PASS')
 
     # Create message container
     msg = MIMEMultipart()
@@ -545,136 +660,349 @@ def send_email(subject, body, to_email, customer_name=None):
     # Attach the body with the msg instance
     msg.attach(MIMEText(formatted_body, 'plain'))
 
-    # Create server connection and send email
+    # Send over the shared, already-authenticated SMTP session
+    mail_transport.send(from_email, to_email, msg.as_string())
+    logger.info(f"Email sent successfully to {to_email} (Subject: {subject})")
+
+def send_email(subject, body, to_email, customer_name=None):
+    """Send an email notification, returning False instead of raising on failure"""
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(from_email, email_password)
-        text = msg.as_string()
-        server.sendmail(from_email, to_email, text)
-        server.quit()
-        logger.info(f"Email sent successfully to {to_email} (Subject: {subject})")
+        deliver_email(subject, body, to_email, customer_name)
         return True
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {e}")
         return False
 
+def deliver_outbox_email(row):
+    """Deliver one queued ``email_outbox`` row"""
+    deliver_email(row['subject'], row['body'], row['recipient'], row['customer_name'])
 
-def create_order_in_db(order_data):
-    """Create a new order with order items, and update stock within a transaction"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            # Start a transaction
-            conn.begin()
+# Order emails are queued in the order transaction and delivered in the background
+email_worker = EmailOutboxWorker(get_db_connection, deliver_outbox_email, run_db)
 
-            logger.info("Checking stock for each item.")
-            # Check stock for each item and lock the rows
-            for item in order_data['items']:
-                cursor.execute("SELECT title, quantity FROM products WHERE id = %s FOR UPDATE", (item['product_id'],))
-                product = cursor.fetchone()
-                if not product:
-                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with ID {item['product_id']} not found")
-                if product['quantity'] <= 0:
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{product['title']}' is out of stock.")
-                if product['quantity'] < item['quantity']:
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Insufficient stock for '{product['title']}'. Only {product['quantity']} left.")
-
-            # Insert order
-            logger.info("Inserting order.")
-            insert_order_query = """
-                INSERT INTO orders (customer_id, shipping_address_id, status, total_amount) 
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(insert_order_query, (
-                order_data['customer_id'],
-                order_data['shipping_address_id'],
-                order_data.get('status', 'pending'),
-                order_data['total_amount']
-            ))
-            order_id = cursor.lastrowid
-
-            logger.info("Inserting order items and updating stock.")
-            # Insert order items and update stock
-            insert_item_query = """
-                INSERT INTO order_items (order_id, product_id, quantity, price) 
-                VALUES (%s, %s, %s, %s)
-            """
-            update_stock_query = "UPDATE products SET quantity = quantity - %s WHERE id = %s"
 
-            for item in order_data['items']:
-                # Insert order item
-                cursor.execute(insert_item_query, (
-                    order_id,
-                    item['product_id'],
-                    item['quantity'],
-                    item['price']
-                ))
-                # Update product stock
-                cursor.execute(update_stock_query, (item['quantity'], item['product_id']))
+def aggregate_item_quantities(items):
+    """Total requested quantity per product id (a cart may list a product twice)"""
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
 
-            conn.commit()
-            logger.info(f"Order {order_id} created successfully.")
+def lock_and_check_stock(cursor, items):
+    """
+    Lock all ordered product rows with a single ``SELECT ... FOR UPDATE`` and
+    validate stock. Rows are locked in primary key order so that overlapping
+    carts always acquire locks in the same order and cannot deadlock each other.
+    Returns the aggregated quantity per product id and the product titles.
+    """
+    quantities = aggregate_item_quantities(items)
+    product_ids = sorted(quantities)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(
+        f"SELECT id, title, quantity FROM products WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE",
+        product_ids
+    )
+    products = {row['id']: row for row in cursor.fetchall()}
+
+    # Report problems in cart order, like the per-item checks did
+    for product_id in quantities:
+        product = products.get(product_id)
+        if not product:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with ID {product_id} not found")
+        if product['quantity'] <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{product['title']}' is out of stock.")
+        if product['quantity'] < quantities[product_id]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Insufficient stock for '{product['title']}'. Only {product['quantity']} left.")
+    return quantities, {product_id: product['title'] for product_id, product in products.items()}
+
+def insert_order_items(cursor, order_id: int, items):
+    """Insert all order items in one multi-row INSERT"""
+    insert_item_query = """
+        INSERT INTO order_items (order_id, product_id, quantity, price) 
+        VALUES (%s, %s, %s, %s)
+    """
+    cursor.executemany(insert_item_query, [
+        (order_id, item['product_id'], item['quantity'], item['price'])
+        for item in items
+    ])
+
+def _quantity_case(quantities):
+    """SQL ``CASE id WHEN ... END`` expression mapping product ids to quantities, with its params"""
+    product_ids = sorted(quantities)
+    params = []
+    for product_id in product_ids:
+        params.extend((product_id, quantities[product_id]))
+    return f"CASE id {' '.join(['WHEN %s THEN %s'] * len(product_ids))} END", params
+
+def decrement_stock(cursor, quantities):
+    """Decrement stock for every product with one set-based UPDATE"""
+    product_ids = sorted(quantities)
+    case_sql, case_params = _quantity_case(quantities)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(
+        f"UPDATE products SET quantity = quantity - {case_sql} WHERE id IN ({placeholders})",
+        case_params + product_ids
+    )
+
+def check_products_exist(cursor, items):
+    """
+    Optimistic mode: verify the ordered products exist with a plain (non-locking)
+    read. Stock is only claimed later by ``decrement_stock_if_available``.
+    Returns the aggregated quantity per product id and the product titles.
+    """
+    quantities = aggregate_item_quantities(items)
+    product_ids = sorted(quantities)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute(f"SELECT id, title FROM products WHERE id IN ({placeholders})", product_ids)
+    titles = {row['id']: row['title'] for row in cursor.fetchall()}
+    for product_id in quantities:
+        if product_id not in titles:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with ID {product_id} not found")
+    return quantities, titles
+
+def decrement_stock_if_available(cursor, quantities):
+    """
+    Optimistic mode: claim stock with a conditional decrement
+    (``quantity = quantity - n WHERE quantity >= n``) for every product in one
+    statement. If fewer rows were updated than ordered, some line ran out of
+    stock: the offending product is reported and the caller rolls back.
+    """
+    product_ids = sorted(quantities)
+    case_sql, case_params = _quantity_case(quantities)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    cursor.execute("SAVEPOINT stock_claim")
+    cursor.execute(
+        f"UPDATE products SET quantity = quantity - {case_sql} "
+        f"WHERE id IN ({placeholders}) AND quantity >= {case_sql}",
+        case_params + product_ids + case_params
+    )
+    if cursor.rowcount == len(product_ids):
+        return
+
+    # Undo the lines that did succeed, then read the latest committed stock to explain the failure
+    cursor.execute("ROLLBACK TO SAVEPOINT stock_claim")
+    cursor.execute(
+        f"SELECT id, title, quantity FROM products WHERE id IN ({placeholders}) LOCK IN SHARE MODE",
+        product_ids
+    )
+    products = {row['id']: row for row in cursor.fetchall()}
+    for product_id in quantities:
+        product = products.get(product_id)
+        if not product:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Product with ID {product_id} not found")
+        if product['quantity'] <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"'{product['title']}' is out of stock.")
+        if product['quantity'] < quantities[product_id]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Insufficient stock for '{product['title']}'. Only {product['quantity']} left.")
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Stock changed while placing the order, please try again")
 
-            # Send email notifications
-            from_email = os.getenv('EMAIL_USER')
-            customer_email = order_data.get('email', '')
-            
-            # Get customer name for personalized emails
-            customer_name = None
-            if order_data.get('customer_id'):
-                try:
-                    with get_db_connection() as email_conn:
-                        email_cursor = email_conn.cursor()
-                        email_cursor.execute("SELECT first_name, last_name FROM customers WHERE id = %s", (order_data['customer_id'],))
-                        customer_info = email_cursor.fetchone()
-                        if customer_info:
-                            customer_name = f"{customer_info['first_name']} {customer_info['last_name']}"
-                except Exception as e:
-                    logger.warning(f"Could not fetch customer name for email: {e}")
-            
-            # Create order items description for emails using order data
-            order_items_description = ""
-            if order_data.get('items'):
-                logger.info(f"Processing {len(order_data['items'])} items for email")
-                
-                # Get product details for each item
-                for item in order_data['items']:
-                    try:
-                        # Get product title for this item
-                        cursor.execute("SELECT title FROM products WHERE id = %s", (item['product_id'],))
-                        product = cursor.fetchone()
-                        product_title = product['title'] if product else f"Product ID {item['product_id']}"
-                        
-                        order_items_description += f"- {product_title}: {item['quantity']} x ${item['price']:.2f} each\n"
-                        logger.info(f"Added item to email: {product_title} x {item['quantity']}")
-                        
-                    except Exception as e:
-                        logger.warning(f"Could not get product title for product {item['product_id']}: {e}")
-                        order_items_description += f"- Product ID {item['product_id']}: {item['quantity']} x ${item['price']:.2f} each\n"
-            else:
-                logger.warning("No items found in order data for email")
-                order_items_description = "No items found\n"
-
-            # Send admin notification with order details
-            admin_subject = f"New Order Received - ID: {order_id}"
-            admin_body = f"You have received a new order with ID: {order_id}.\n\nCustomer Name: {customer_name if customer_name else 'N/A'}\nEmail: {customer_email}\nTotal Amount: ${order_data['total_amount']:.2f}\n\nOrder Details:\n{order_items_description}"
-            send_email(admin_subject, admin_body, from_email)
-
-            # Send customer confirmation with order details
-            customer_subject = "Your TrendyOft Order Confirmation"
-            customer_body = f"Thank you for your order!\nYour order has been successfully placed with ID: {order_id}.\n\nHere are your order details:\n{order_items_description}\nTotal Amount: ${order_data['total_amount']:.2f}\n\nWe will process your order promptly and send you updates."
-            if customer_email:
-                send_email(customer_subject, customer_body, customer_email, customer_name)
-
-            return order_id
-        except HTTPException as e:
-            conn.rollback()
-            raise e
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error creating order: {e}")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred while creating the order: {e}")
+def insert_order_to_db(cursor, order_data):
+    """
+    Check the ordered products (locking their rows in pessimistic mode) and
+    insert the order and its items. Stock is not touched: the caller claims
+    it with ``claim_order_stock`` as the last step before commit.
+    Returns ``(order_id, quantities, titles)``.
+    """
+    if ORDER_STOCK_MODE == "optimistic":
+        # No row locks yet: stock is claimed by a conditional UPDATE right before commit
+        logger.info("Checking products exist (optimistic stock mode).")
+        quantities, titles = check_products_exist(cursor, order_data['items'])
+    else:
+        logger.info("Checking stock for each item.")
+        # Lock every ordered product row with one statement and validate stock
+        quantities, titles = lock_and_check_stock(cursor, order_data['items'])
+
+    # Insert order
+    logger.info("Inserting order.")
+    insert_order_query = """
+        INSERT INTO orders (customer_id, shipping_address_id, status, total_amount) 
+        VALUES (%s, %s, %s, %s)
+    """
+    cursor.execute(insert_order_query, (
+        order_data['customer_id'],
+        order_data['shipping_address_id'],
+        order_data.get('status', 'pending'),
+        order_data['total_amount']
+    ))
+    order_id = cursor.lastrowid
+
+    logger.info("Inserting order items.")
+    # One multi-row insert for the items
+    insert_order_items(cursor, order_id, order_data['items'])
+    return order_id, quantities, titles
+
+def claim_order_stock(cursor, quantities):
+    """
+    Decrement stock for an order with one set-based UPDATE and record the
+    new quantities as ``stock`` events. Run it last, right before commit: in
+    optimistic mode it is the first statement that locks the product rows,
+    so hot rows stay locked only for these two statements and the commit.
+    The event INSERT ... SELECT only reads rows the UPDATE already locked.
+    """
+    logger.info("Claiming stock.")
+    if ORDER_STOCK_MODE == "optimistic":
+        decrement_stock_if_available(cursor, quantities)
+    else:
+        decrement_stock(cursor, quantities)
+    record_product_events(cursor, 'stock', sorted(quantities))
+
+def queue_order_notifications(order_id: int, order_data, conn=None, titles=None):
+    """
+    Queue the admin and customer emails for an order in ``email_outbox``.
+    Call this inside the order transaction, before stock is claimed, so
+    emails exist only for committed orders without extending row locks.
+    ``titles`` maps product ids to the titles read while checking the order;
+    the customer's name comes from ``order_data['customer_name']`` when set.
+    """
+    from_email = os.getenv('EMAIL_USER')
+    customer_email = order_data.get('email', '')
+    titles = titles or {}
+
+    with use_db_connection(conn) as db:
+        cursor = db.cursor()
+
+        # Get customer name for personalized emails
+        customer_name = order_data.get('customer_name')
+        if customer_name is None and order_data.get('customer_id'):
+            try:
+                cursor.execute("SELECT first_name, last_name FROM customers WHERE id = %s", (order_data['customer_id'],))
+                customer_info = cursor.fetchone()
+                if customer_info:
+                    customer_name = f"{customer_info['first_name']} {customer_info['last_name']}"
+            except Exception as e:
+                logger.warning(f"Could not fetch customer name for email: {e}")
+        
+        # Create order items description for emails using order data
+        order_items_description = ""
+        if order_data.get('items'):
+            logger.info(f"Processing {len(order_data['items'])} items for email")
+            for item in order_data['items']:
+                product_title = titles.get(item['product_id'], f"Product ID {item['product_id']}")
+                order_items_description += f"- {product_title}: {item['quantity']} x ${item['price']:.2f} each\n"
+                logger.info(f"Added item to email: {product_title} x {item['quantity']}")
+        else:
+            logger.warning("No items found in order data for email")
+            order_items_description = "No items found\n"
+
+        # Queue admin notification with order details
+        admin_subject = f"New Order Received - ID: {order_id}"
+        admin_body = f"You have received a new order with ID: {order_id}.\n\nCustomer Name: {customer_name if customer_name else 'N/A'}\nEmail: {customer_email}\nTotal Amount: ${order_data['total_amount']:.2f}\n\nOrder Details:\n{order_items_description}"
+        enqueue_email(cursor, admin_subject, admin_body, from_email, order_id=order_id)
+
+        # Queue customer confirmation with order details
+        customer_subject = "Your TrendyOft Order Confirmation"
+        customer_body = f"Thank you for your order!\nYour order has been successfully placed with ID: {order_id}.\n\nHere are your order details:\n{order_items_description}\nTotal Amount: ${order_data['total_amount']:.2f}\n\nWe will process your order promptly and send you updates."
+        if customer_email:
+            enqueue_email(cursor, customer_subject, customer_body, customer_email, customer_name, order_id=order_id)
+
+def insert_payment_details_to_db(order_id: int, payment_provider: str, amount: float, conn=None):
+    """Record payment details for an order (inside ``conn``'s transaction when given)"""
+    with use_db_connection(conn) as db:
+        cursor = db.cursor()
+        payment_id = f"payment_{order_id}_{uuid.uuid4().hex[:8]}"
+        insert_payment_query = """
+            INSERT INTO payment_details (order_id, payment_provider, payment_id, status, amount, currency) 
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        cursor.execute(insert_payment_query, (
+            order_id,
+            payment_provider or 'credit_card',
+            payment_id,
+            'completed',  # Assuming payment is processed immediately
+            amount,
+            'INR'  # Indian Rupees
+        ))
+        if conn is None:
+            db.commit()
+        return payment_id
+
+def get_order_by_id_from_db(order_id: int, conn=None):
+    """Fetch a single order row by ID"""
+    with use_db_connection(conn) as db:
+        cursor = db.cursor()
+        cursor.execute("""
+            SELECT id, customer_id, shipping_address_id, status, total_amount, order_date 
+            FROM orders WHERE id = %s
+        """, (order_id,))
+        return cursor.fetchone()
+
+def checkout_order_in_db(uow: UnitOfWork, order: "OrderCreate", user_email: str):
+    """
+    Run the whole checkout on the request's unit of work: customer, shipping
+    address, order, stock and payment rows are written in one transaction on
+    one connection, so a failed order leaves no orphan rows behind. Stock is
+    claimed by the last statement before commit.
+    """
+    conn = uow.begin()
+
+    # Always create new customer record for each order, using checkout form data if available
+    logger.info("Creating new customer record with checkout form data.")
+    customer_data = {
+        'first_name': order.first_name if order.first_name else 'Unknown',
+        'last_name': order.last_name if order.last_name else 'Unknown',
+        'email': user_email,
+        'phone_number': order.phone_number
+    }
+    customer_id = insert_customer_to_db(customer_data, conn=conn)
+    logger.info(f"Created customer record: {customer_data['first_name']} {customer_data['last_name']}, Phone: {order.phone_number}")
+
+    # Always create new shipping address from the checkout details
+    address_data = {
+        'address_line1': order.shipping_address_line1 or 'Default Address',
+        'address_line2': order.shipping_address_line2 or '',
+        'city': order.city or 'Default City',
+        'country': order.country or 'Default Country',
+        'zip_code': order.zip_code or '00000'
+    }
+    shipping_address_id = insert_shipping_address_to_db(customer_id, address_data, conn=conn)
+
+    order_data = order.dict()
+    order_data['customer_id'] = customer_id
+    order_data['shipping_address_id'] = shipping_address_id
+    order_data['email'] = user_email  # Pass customer email and name for notifications
+    order_data['customer_name'] = f"{customer_data['first_name']} {customer_data['last_name']}"
+    cursor = conn.cursor()
+    order_id, quantities, titles = insert_order_to_db(cursor, order_data)
+
+    # Payment details are best effort: a failure must not lose the order
+    if order.payment_provider:
+        cursor.execute("SAVEPOINT payment_details")
+        try:
+            insert_payment_details_to_db(order_id, order.payment_provider, order.total_amount, conn=conn)
+            logger.info(f"Payment details added for order {order_id}")
+        except Exception as payment_error:
+            cursor.execute("ROLLBACK TO SAVEPOINT payment_details")
+            logger.warning(f"Failed to add payment details for order {order_id}: {payment_error}")
+
+    # Emails are queued in this transaction; the outbox worker sends them after commit
+    queue_order_notifications(order_id, order_data, conn, titles)
+
+    created_order = get_order_by_id_from_db(order_id, conn=conn)
+
+    # Stock is claimed last, so contended product rows are locked only until the commit
+    claim_order_stock(cursor, quantities)
+    uow.commit()
+    logger.info(f"Order {order_id} created successfully for user {user_email}")
+    # The stock just changed: this worker's cached rows must not outlive the commit
+    for product_id in quantities:
+        product_cache.invalidate(product_id)
+    db_router.pin_primary(orders_pin_key(user_email))
+    email_worker.wake()
+    product_events.wake()
+    schedule_event_pruning()
+    return created_order
+
+def place_order_in_db(order: "OrderCreate", user_email: str):
+    """
+    Run checkout (retried on deadlock) on one unit of work within a single
+    executor task: its connection is checked out, committed or rolled back
+    and released by this call, never held across awaits.
+    """
+    with UnitOfWork(get_db_connection) as uow:
+        return order_retrier.run(
+            checkout_order_in_db, uow, order, user_email,
+            on_retry=lambda error: uow.rollback()
+        )
 
 # Legacy support - keeping products_db for backward compatibility during transition
 products_db = []
@@ -780,6 +1108,10 @@ class ProductResponse(BaseModel):
     is_active: bool = True
     stock_status: str  # New field for stock status
 
+# Validate handler-built products when TRUSTED_OUTPUT is off
+product_adapter = TypeAdapter(ProductResponse)
+product_list_adapter = TypeAdapter(List[ProductResponse])
+
 # Stock check models
 class StockCheckResponse(BaseModel):
     available: bool
@@ -881,8 +1213,10 @@ def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     return credentials.credentials
 
 # Helper function to create square thumbnail with proper centering
-def create_square_thumbnail(image: Image.Image, size: int) -> Image.Image:
+def create_square_thumbnail(image: "Image.Image", size: int) -> "Image.Image":
     """Create a square thumbnail by cropping the center of the image"""
+    from PIL import Image
+
     # Calculate the crop box to get the center square
     width, height = image.size
     if width > height:
@@ -907,8 +1241,10 @@ def create_square_thumbnail(image: Image.Image, size: int) -> Image.Image:
     return square_image
 
 # Helper function to resize image maintaining aspect ratio
-def resize_with_aspect_ratio(image: Image.Image, target_width: int, target_height: int) -> Image.Image:
+def resize_with_aspect_ratio(image: "Image.Image", target_width: int, target_height: int) -> "Image.Image":
     """Resize image to fit within target dimensions while maintaining aspect ratio"""
+    from PIL import Image
+
     # Calculate scaling factor to fit within target dimensions
     scale_w = target_width / image.width
     scale_h = target_height / image.height
@@ -926,6 +1262,9 @@ def resize_with_aspect_ratio(image: Image.Image, target_width: int, target_heigh
 # Enhanced function to save uploaded image with multiple sizes
 def save_uploaded_image_with_sizes(file: UploadFile) -> dict:
     """Save uploaded image in multiple sizes and return URLs"""
+    # Pillow is only needed by admin uploads, so it is not imported at startup
+    from PIL import Image
+
     # Generate unique filename base
     file_extension = file.filename.split(".")[-1].lower()
     if file_extension not in ["jpg", "jpeg", "png", "gif", "webp"]:
@@ -939,6 +1278,7 @@ def save_uploaded_image_with_sizes(file: UploadFile) -> dict:
     filename_base = f"{unique_id}.{file_extension}"
     
     # Save original uploaded file temporarily
+    ensure_image_dirs()
     temp_path = os.path.join(IMAGES_DIR, f"temp_{filename_base}")
     with open(temp_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
@@ -1060,17 +1400,47 @@ def check_stock_availability(product_id: int, requested_quantity: int):
 
 # API Endpoints
 
-from fastapi.responses import FileResponse
+# The site's own files are compressed once per deploy and revalidated by ETag
+STATIC_CACHE_CONTROL = "public, max-age=0, must-revalidate"
 
-@app.get("/")
-async def serve_website():
+@app.api_route("/", methods=["GET", "HEAD"])
+async def serve_website(request: Request):
     """Serve the main website"""
-    return FileResponse('index.html')
-
-@app.get("/style.css")
-async def serve_css():
+    # Reading and compressing a changed file is blocking work
+    website = await run_in_threadpool(encoded_file, 'index.html', 'text/html; charset=utf-8')
+    return website.conditional_response(
+        request.headers, headers={"Cache-Control": STATIC_CACHE_CONTROL}
+    )
+
+@app.api_route("/style.css", methods=["GET", "HEAD"])
+async def serve_css(request: Request):
     """Serve the CSS file"""
-    return FileResponse('style.css', media_type='text/css')
+    css = await run_in_threadpool(encoded_file, 'style.css', 'text/css; charset=utf-8')
+    return css.conditional_response(
+        request.headers, headers={"Cache-Control": STATIC_CACHE_CONTROL}
+    )
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def serve_static(path: str, request: Request):
+    """Serve a website file: text assets precompressed like /, anything else as is"""
+    file_path = os.path.realpath(os.path.join(STATIC_DIR, path))
+    if not file_path.startswith(STATIC_DIR + os.sep) or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Not Found")
+    media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    if media_type.startswith("text/"):
+        media_type += "; charset=utf-8"
+    if is_compressible(media_type):
+        asset = await run_in_threadpool(encoded_file, file_path, media_type)
+        return asset.conditional_response(request.headers, headers={"Cache-Control": STATIC_CACHE_CONTROL})
+
+    # Images and other binaries: compressing them again would not pay off,
+    # but they are still revalidated by ETag / Last-Modified
+    stat = os.stat(file_path)
+    etag = make_etag(stat.st_mtime_ns, stat.st_size)
+    headers = validator_headers(etag, stat.st_mtime, cache_control=STATIC_CACHE_CONTROL)
+    if is_not_modified(request.headers, etag, stat.st_mtime):
+        return not_modified(headers)
+    return FileResponse(file_path, media_type=media_type, headers=headers, stat_result=stat)
 
 @app.get("/api")
 async def api_info():
@@ -1086,78 +1456,264 @@ async def api_info():
         }
     }
 
-@app.get("/products/", response_model=List[ProductResponse])
-async def get_products():
-    """Get all products - OPTIMIZED FOR LCP"""
-    global products_cache, products_cache_time
+@app.on_event("startup")
+async def check_database_schema():
+    """Warn when the database is behind the code; migrations run out of band"""
+    if not DATABASE_CONFIGURED:
+        logger.warning("Database environment variables not found - running without database")
+        return
+
+    def read_version():
+        try:
+            with get_db_connection() as conn:
+                return check_schema_version(conn)
+        except Exception as e:
+            logger.error(f"Could not check database schema version: {e}")
+
+    # In the background: a slow database must not delay the first response
+    db_executor.submit(read_version)
+
+@app.on_event("startup")
+async def warm_database_pools():
+    """Open DB_POOL_MIN_SIZE connections per pool in this worker before traffic needs them"""
+    if DATABASE_CONFIGURED:
+        db_executor.submit(db_router.warm_up)
+
+@app.on_event("startup")
+async def start_email_worker():
+    """Deliver queued order emails in the background of this worker process"""
+    if DATABASE_CONFIGURED and os.getenv('EMAIL_OUTBOX_WORKER', 'true').lower() in ('1', 'true', 'yes'):
+        email_worker.start()
+
+@app.on_event("shutdown")
+async def close_database_resources():
+    """Stop background work, the database executor and pooled connections"""
+    await email_worker.stop()
+    await product_events.stop()
+    # Closing waits for a send in progress, so it must not block the event loop
+    await run_in_threadpool(mail_transport.close)
+    db_executor.shutdown(wait=False)
+    db_router.close_all()
+
+@app.get("/pool-stats/")
+async def get_pool_stats(token: str = Depends(verify_admin_token)):
+    """Database connection pool statistics for monitoring - Admin only"""
+    return {
+        "database": db_router.stats(),
+        "order_transactions": order_retrier.stats(),
+        "email_outbox": email_worker.stats(),
+        "smtp": mail_transport.stats(),
+        "catalog_version": catalog_version.stats(),
+        "products_cache": products_cache.stats(),
+        "product_cache": product_cache.stats(),
+        "product_events": product_events.stats()
+    }
+
+async def load_products(after_id: Optional[int], limit: int, fields=None, image_preset=DEFAULT_LIST_PRESET):
+    """Fetch, format and encode one product list page; returns (body, next_cursor)"""
+    if fields is not None:
+        products, next_cursor = await run_db(get_products_from_db, after_id, limit, product_columns(fields), image_preset)
+        body = dumps([format_product_fields(product, fields) for product in products])
+        return EncodedBody(body), next_cursor
+    
+    products, next_cursor = await run_db(get_products_from_db, after_id, limit, PRODUCT_LIST_COLUMNS, image_preset)
     
-    # Check cache
-    if products_cache and products_cache_time:
-        if (datetime.now() - products_cache_time).total_seconds() < CACHE_DURATION:
-            return products_cache
+    # Minimal formatting for speed
+    formatted_products = []
+    for product in products:
+        formatted_products.append({
+            'id': product['id'],
+            'title': product['title'],
+            'price': float(product['price']),
+            'quantity': product['quantity'],
+            'category': product['category'],
+            'image_url': product.get('image_thumb_url') or '',
+            'images': {
+                'thumbnail': product.get('image_thumb_url') or '',
+                'main': product.get('image_thumb_url') or '',
+                'original': product.get('image_thumb_url') or ''
+            },
+            'description': '',  # Don't send description on list
+            'created_at': '',
+            'updated_at': None,
+            'is_active': True,
+            'stock_status': 'In Stock' if product['quantity'] > 0 else 'Out of Stock'
+        })
     
+    # Serialize and compress once; cache hits skip serialization entirely
+    if TRUSTED_OUTPUT:
+        body = dumps(formatted_products)
+    else:
+        body = product_list_adapter.dump_json(product_list_adapter.validate_python(formatted_products))
+    return EncodedBody(body), next_cursor
+
+@app.get("/products/", response_model=List[ProductResponse])
+async def get_products(
+    request: Request,
+    cursor: Optional[int] = Query(None, ge=1, description="Last product id of the previous page"),
+    limit: int = Query(PRODUCTS_PAGE_SIZE, ge=1, le=PRODUCTS_MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,price,thumb,stock_status"),
+    image_preset: str = Query(DEFAULT_LIST_PRESET, description=f"Image size preset: {', '.join(IMAGE_PRESETS)}")
+):
+    """Get one page of products, newest first - OPTIMIZED FOR LCP
+    
+    The next page's cursor is returned in the X-Next-Cursor header (and as a
+    Link rel="next"); it is absent on the last page. Image URLs use the
+    ``image_preset`` size.
+    """
+    selected = parse_product_fields(fields)
+    check_image_preset(image_preset)
     try:
-        products = get_products_from_db()
-        
-        # Minimal formatting for speed
-        formatted_products = []
-        for product in products:
-            formatted_products.append({
-                'id': product['id'],
-                'title': product['title'],
-                'price': float(product['price']),
-                'quantity': product['quantity'],
-                'category': product['category'],
-                'image_url': product.get('image_thumb_url', ''),
-                'image_thumb_url': product.get('image_thumb_url', ''),
-                'images': {
-                    'thumbnail': product.get('image_thumb_url', ''),
-                    'main': product.get('image_thumb_url', ''),
-                    'original': product.get('image_thumb_url', '')
-                },
-                'description': '',  # Don't send description on list
-                'created_at': '',
-                'updated_at': None,
-                'is_active': True,
-                'stock_status': 'In Stock' if product['quantity'] > 0 else 'Out of Stock'
-            })
-        
-        # Cache it
-        products_cache = formatted_products
-        products_cache_time = datetime.now()
-        
-        return formatted_products
+        version = await catalog_version.current()
+        fields_key = ','.join(selected) if selected else '*'
+        encoded, next_cursor = await products_cache.get(
+            f"list:{cursor}:{limit}:{fields_key}:{image_preset}",
+            lambda: load_products(cursor, limit, selected, image_preset),
+            version
+        )
+        headers = {"Cache-Control": CATALOG_CACHE_CONTROL}
+        if next_cursor is not None:
+            extra_params = f"&fields={fields_key}" if selected else ""
+            if image_preset != DEFAULT_LIST_PRESET:
+                extra_params += f"&image_preset={image_preset}"
+            headers["X-Next-Cursor"] = str(next_cursor)
+            headers["Link"] = f'</products/?cursor={next_cursor}&limit={limit}{extra_params}>; rel="next"'
+        return encoded.conditional_response(request.headers, headers=headers)
     except Exception as e:
         logger.error(f"Error: {e}")
-        return products_cache if products_cache else []
+        return []
         
+# Batch lookups (cart and checkout); declared before /products/{product_id},
+# which would otherwise match "batch"
+PRODUCTS_MAX_BATCH = 100
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+    fields: Optional[str] = None
+    image_preset: Optional[str] = None
+
+async def lookup_products(product_ids: List[int], fields: Optional[str], image_preset: Optional[str] = None):
+    """Products for ``product_ids`` in request order, plus the ids not found"""
+    selected = parse_product_fields(fields)
+    check_image_preset(image_preset)
+    product_ids = list(dict.fromkeys(product_ids))  # de-duplicate, keeping order
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="No product ids given")
+    if len(product_ids) > PRODUCTS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCTS_MAX_BATCH} products per request")
+    if any(product_id < 1 for product_id in product_ids):
+        raise HTTPException(status_code=400, detail="Product ids must be positive")
+    
+    try:
+        await catalog_version.current()
+        if selected is not None:
+            found = await run_db(get_products_by_ids, product_ids, product_columns(selected))
+        else:
+            found = await run_db(get_products_by_ids, product_ids)
+        preset_urls = {}
+        if image_preset is not None and found:
+            preset_urls = await run_db(get_image_preset_urls, list(found), image_preset)
+    except Exception as e:
+        logger.error(f"Error fetching products {product_ids}: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching products")
+    
+    products = []
+    for product_id in product_ids:
+        product = found.get(product_id)
+        if product is not None:
+            product = format_product_fields(product, selected) if selected else format_product(product)
+            if product_id in preset_urls:
+                apply_image_preset(product, preset_urls[product_id])
+            products.append(product)
+    return trusted_response({
+        "products": products,
+        "missing": [product_id for product_id in product_ids if product_id not in found]
+    })
+
+@app.get("/products/batch")
+async def get_products_batch(
+    ids: str = Query(..., description="Comma-separated product ids, e.g. 1,2,3"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,price,thumb,stock_status"),
+    image_preset: Optional[str] = Query(None, description=f"Image size preset for every image field: {', '.join(IMAGE_PRESETS)}")
+):
+    """Get several products in one request, in the order asked for - Public endpoint"""
+    try:
+        product_ids = [int(product_id) for product_id in ids.split(',') if product_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    return await lookup_products(product_ids, fields, image_preset)
+
+@app.post("/products/batch")
+async def post_products_batch(batch: ProductBatchRequest):
+    """Same as GET /products/batch, for id lists too long for a URL - Public endpoint"""
+    return await lookup_products(batch.ids, batch.fields, batch.image_preset)
+
+@app.get("/products/events")
+async def stream_product_events(request: Request):
+    """Live product changes (created / updated / deleted / stock) as Server-Sent Events - Public endpoint
+    
+    Reconnecting clients send Last-Event-ID and get the events they missed.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    try:
+        subscription = await product_events.subscribe(last_event_id)
+    except Exception as e:
+        logger.error(f"Could not start product event stream: {e}")
+        raise HTTPException(status_code=503, detail="Product events are unavailable", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        product_events.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int):
-    """Get a specific product by ID - Public endpoint"""
+async def get_product(
+    product_id: int,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,price,thumb,stock_status"),
+    image_preset: Optional[str] = Query(None, description=f"Image size preset for every image field: {', '.join(IMAGE_PRESETS)}")
+):
+    """Get a specific product by ID - Public endpoint
+    
+    Without ``image_preset`` the stored thumbnail, main and original images
+    are returned; with it every image field is that preset's URL.
+    """
+    selected = parse_product_fields(fields)
+    check_image_preset(image_preset)
     try:
-        product = get_product_by_id(product_id)
+        await catalog_version.current()  # notice other workers' writes before trusting the product cache
+        if selected is not None:
+            product = await run_db(get_product_by_id, product_id, product_columns(selected))
+        else:
+            product = await run_db(get_product_by_id, product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
+        preset_url = None
+        if image_preset is not None:
+            preset_url = (await run_db(get_image_preset_urls, [product_id], image_preset)).get(product_id)
         
-        # Handle NULL image values by providing empty strings as fallback
-        image_main = product.get('image_main_url') or ''
-        image_thumb = product.get('image_thumb_url') or ''
-        image_full = product.get('image_full_url') or ''
+        # Validators come from the row itself (updated_at moves on every change,
+        # including stock), so a revalidation skips all formatting
+        etag = make_etag(','.join(selected) if selected else '*', image_preset, preset_url, *sorted(product.items()))
+        modified_at = product.pop('modified_at')
+        headers = validator_headers(etag=etag, last_modified=modified_at)
+        if is_not_modified(request.headers, etag, modified_at):
+            return not_modified(headers)
         
-        # Format product to match expected response
-        formatted_product = {
-            **product,
-            'image_url': image_main,  # Backward compatibility
-            'images': {
-                'thumbnail': image_thumb,
-                'main': image_main,
-                'original': image_full
-            },
-            'created_at': product['created_at'].isoformat() if product.get('created_at') else '',
-            'updated_at': product['updated_at'].isoformat() if product.get('updated_at') else None,
-            'stock_status': 'In Stock' if product.get('quantity', 0) > 0 else 'Out of Stock'
-        }
-        return formatted_product
+        if selected is not None:
+            # Partial objects don't match ProductResponse, so they are never validated against it
+            formatted = format_product_fields(product, selected)
+        else:
+            formatted = format_product(product)
+        if preset_url is not None:
+            apply_image_preset(formatted, preset_url)
+        if selected is not None:
+            return trusted_response(formatted, headers=headers)
+        return trusted_response(formatted, product_adapter, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -1171,7 +1727,7 @@ async def check_stock(product_id: int, quantity: int = 1):
         if quantity <= 0:
             raise HTTPException(status_code=400, detail="Quantity must be greater than 0")
         
-        stock_info = check_stock_availability(product_id, quantity)
+        stock_info = await run_db(check_stock_availability, product_id, quantity)
         
         if not stock_info["available"]:
             return {
@@ -1234,28 +1790,14 @@ async def add_product(
     
     try:
         # Insert product into database
-        product_id = insert_product_to_db(product_data)
+        product_id = await run_db(insert_product_to_db, product_data)
         
         # Fetch the created product to return
-        created_product = get_product_by_id(product_id)
+        created_product = await run_db(get_product_by_id, product_id)
         if not created_product:
             raise HTTPException(status_code=500, detail="Failed to retrieve created product")
         
-        # Format response
-        formatted_product = {
-            **created_product,
-            'image_url': created_product.get('image_main_url', ''),  # Backward compatibility
-            'images': {
-                'thumbnail': created_product.get('image_thumb_url', ''),
-                'main': created_product.get('image_main_url', ''),
-                'original': created_product.get('image_full_url', '')
-            },
-            'created_at': created_product['created_at'].isoformat() if created_product.get('created_at') else '',
-            'updated_at': created_product['updated_at'].isoformat() if created_product.get('updated_at') else None,
-            'stock_status': 'In Stock' if created_product.get('quantity', 0) > 0 else 'Out of Stock'
-        }
-        
-        return formatted_product
+        return trusted_response(format_product(created_product), product_adapter)
         
     except Exception as e:
         logger.error(f"Error creating product: {e}")
@@ -1280,7 +1822,7 @@ async def update_product(
     """Update an existing product - Admin only"""
     
     # Fetch existing product
-    existing_product = get_product_by_id(product_id)
+    existing_product = await run_db(get_product_by_id, product_id)
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -1321,29 +1863,15 @@ async def update_product(
     
     # Update product in database
     try:
-        if not update_product_in_db(product_id, {k: v for k, v in update_data.items() if v is not None}):
+        if not await run_db(update_product_in_db, product_id, {k: v for k, v in update_data.items() if v is not None}):
             raise HTTPException(status_code=500, detail="Failed to update product")
 
         # Fetch updated product
-        updated_product = get_product_by_id(product_id)
+        updated_product = await run_db(get_product_by_id, product_id)
         if not updated_product:
             raise HTTPException(status_code=500, detail="Failed to retrieve updated product")
 
-        # Format response
-        formatted_product = {
-            **updated_product,
-            'image_url': updated_product.get('image_main_url', ''),  # Backward compatibility
-            'images': {
-                'thumbnail': updated_product.get('image_thumb_url', ''),
-                'main': updated_product.get('image_main_url', ''),
-                'original': updated_product.get('image_full_url', '')
-            },
-            'created_at': updated_product['created_at'].isoformat() if updated_product.get('created_at') else '',
-            'updated_at': updated_product['updated_at'].isoformat() if updated_product.get('updated_at') else None,
-            'stock_status': 'In Stock' if updated_product.get('quantity', 0) > 0 else 'Out of Stock'
-        }
-
-        return formatted_product
+        return trusted_response(format_product(updated_product), product_adapter)
     except Exception as e:
         logger.error(f"Error updating product {product_id}: {e}")
         raise HTTPException(status_code=500, detail="Error updating product")
@@ -1376,7 +1904,7 @@ async def delete_product(
     
     # Delete product from database
     try:
-        if not delete_product_from_db(product_id):
+        if not await run_db(delete_product_from_db, product_id):
             raise HTTPException(status_code=404, detail="Product not found")
 
         return {"message": f"Product with ID {product_id} deleted successfully"}
@@ -1389,15 +1917,23 @@ async def delete_product(
         raise HTTPException(status_code=500, detail="Error deleting product")
 
 @app.get("/categories/")
-async def get_categories():
+async def get_categories(request: Request, response: Response):
     """Get all unique categories with metadata - Public endpoint"""
     try:
-        categories = get_categories_from_db()
+        # Category counts only change through admin writes, which bump the catalog
+        # version, so a matching ETag is answered without querying at all
+        version = await catalog_version.current()
+        etag = make_etag("categories", version) if version is not None else None
+        if etag is not None and is_not_modified(request.headers, etag):
+            return not_modified(validator_headers(etag=etag))
+        
+        categories = await run_db(get_categories_from_db)
+        response.headers.update(validator_headers(etag=etag or make_etag("categories", categories)))
         
         if not categories:
             return {"categories": []}
         
-        total_products = sum(cat['total_products'] for cat in categories)
+        total_products = sum(cat['count'] for cat in categories)
         
         return {
             "categories": categories,
@@ -1486,6 +2022,8 @@ async def search_products(q: str = ""):
 
 # Authentication helper functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -1497,6 +2035,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token and return user email"""
+    import jwt
+
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -1513,18 +2053,19 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+@db_router.fallback_to_primary
 def get_user_orders_from_db(user_email: str):
     """Fetch all orders for a specific user by email"""
     try:
         logger.info(f"Fetching orders for user: {user_email}")
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True, pin_key=orders_pin_key(user_email)) as conn:
             cursor = conn.cursor()
             
             # First get customer ID from email
@@ -1602,6 +2143,7 @@ def register_user(user: UserCreate):
                 )
             
             # Hash password
+            import bcrypt
             hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt(rounds=10))
             
             # Insert new user
@@ -1626,6 +2168,7 @@ def login_for_access_token(form_data: UserLogin):
             cursor.execute("SELECT id, email, password_hash, username FROM users WHERE email = %s", (form_data.email,))
             user = cursor.fetchone()
             
+            import bcrypt
             if not user or not bcrypt.checkpw(form_data.password.encode('utf-8'), user['password_hash'].encode('utf-8')):
                 if form_data.email == 'shaikhdanish.sd06@gmail.com' and form_data.password == 'correct_password':
                     return {"access_token": "dummy_token", "token_type": "bearer", "username": "danish"}
@@ -1651,7 +2194,7 @@ def login_for_access_token(form_data: UserLogin):
 async def get_my_orders(user_email: str = Depends(verify_token)):
     """Get all orders for the authenticated user"""
     try:
-        orders = get_user_orders_from_db(user_email)
+        orders = await run_db(get_user_orders_from_db, user_email)
         if not orders:
             return {
                 "orders": [],
@@ -1667,61 +2210,19 @@ async def get_my_orders(user_email: str = Depends(verify_token)):
         raise HTTPException(status_code=500, detail=f"Error fetching orders: {str(e)}")
 
 @app.post("/place-order/", response_model=OrderResponse)
-async def place_order(order: OrderCreate, user_email: str = Depends(verify_token)):
+async def place_order(
+    order: OrderCreate,
+    user_email: str = Depends(verify_token)
+):
     """
     Place a new order. This endpoint is for authenticated users.
     
-    - Verify user and customer existence.
-    - Validate product availability and stock levels.
-    - Validate shipping information.
+    - Validate order items and totals before touching the database.
+    - Create customer, shipping address, order, stock and payment rows in one transaction.
     - Log detailed messages for troubleshooting.
     """
     try:
-        # Validate customer existence or create/update customer record
-        customer = get_customer_by_email(user_email)
-        
-        # Use checkout form data for customer information
-        checkout_first_name = order.first_name
-        checkout_last_name = order.last_name
-        checkout_phone = order.phone_number
-        
-        logger.info(f"Checkout form data: first_name={checkout_first_name}, last_name={checkout_last_name}, phone={checkout_phone}")
-        
-        # Always create new customer record for each order
-        logger.info("Creating new customer record with checkout form data.")
-        
-        # Use checkout form data if available
-        first_name = checkout_first_name if checkout_first_name else 'Unknown'
-        last_name = checkout_last_name if checkout_last_name else 'Unknown'
-
-        customer_data = {
-            'first_name': first_name,
-            'last_name': last_name,
-            'email': user_email,
-            'phone_number': checkout_phone
-        }
-        customer_id = insert_customer_to_db(customer_data)
-        customer = {'id': customer_id, **customer_data}
-        logger.info(f"Created customer record: {first_name} {last_name}, Phone: {checkout_phone}")
-
-        # Create or update shipping address
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Get shipping details from order
-            address_line1 = getattr(order, 'shipping_address_line1', None) or 'Default Address'
-            address_line2 = getattr(order, 'shipping_address_line2', '') or ''
-            city = getattr(order, 'city', None) or 'Default City'
-            country = getattr(order, 'country', None) or 'Default Country'
-            zip_code = getattr(order, 'zip_code', None) or '00000'
-
-            # Always create new shipping address
-            cursor.execute(
-                "INSERT INTO shipping_addresses (customer_id, address_line1, address_line2, city, country, zip_code) VALUES (%s, %s, %s, %s, %s, %s)",
-                (customer['id'], address_line1, address_line2, city, country, zip_code)
-            )
-            conn.commit()
-            shipping_address_id = cursor.lastrowid
+        logger.info(f"Checkout form data: first_name={order.first_name}, last_name={order.last_name}, phone={order.phone_number}")
 
         # Validate order data
         if not order.items or len(order.items) == 0:
@@ -1738,64 +2239,32 @@ async def place_order(order: OrderCreate, user_email: str = Depends(verify_token
                 raise HTTPException(status_code=400, detail=f"Invalid price for product {item.product_id}")
         
         logger.info(f"Order validation passed. Items: {len(order.items)}, Total: {order.total_amount}")
-        
-        order_data = order.dict()
-        order_data['customer_id'] = customer['id']
-        order_data['shipping_address_id'] = shipping_address_id
-        order_data['email'] = user_email  # Pass customer email for notifications
 
-        # Create order using the existing function
         try:
-            order_id = create_order_in_db(order_data)
-            logger.info(f"Order {order_id} created successfully for user {user_email}")
-            
-            # Insert payment details if provided (separate transaction)
-            if order_id and (order.payment_provider):
-                try:
-                    with get_db_connection() as conn:
-                        cursor = conn.cursor()
-                        payment_id = f"payment_{order_id}_{uuid.uuid4().hex[:8]}"
-                        insert_payment_query = """
-                            INSERT INTO payment_details (order_id, payment_provider, payment_id, status, amount, currency) 
-                            VALUES (%s, %s, %s, %s, %s, %s)
-                        """
-                        cursor.execute(insert_payment_query, (
-                            order_id,
-                            order.payment_provider or 'credit_card',
-                            payment_id,
-                            'completed',  # Assuming payment is processed immediately
-                            order.total_amount,
-                            'INR'  # Indian Rupees
-                        ))
-                        conn.commit()
-                        logger.info(f"Payment details added for order {order_id}")
-                except Exception as payment_error:
-                    logger.warning(f"Failed to add payment details for order {order_id}: {payment_error}")
-                    # Don't fail the entire order if payment details fail to save
-                    
+            created_order = await run_db(place_order_in_db, order, user_email)
+        except HTTPException:
+            raise
         except Exception as e:
+            if is_retryable_error(e):
+                logger.error(f"Order for user {user_email} still contended after retries: {e}")
+                raise HTTPException(
+                    status_code=503,
+                    detail="The store is very busy right now, please try placing your order again",
+                    headers={"Retry-After": "1"}
+                )
             logger.error(f"Failed to create order for user {user_email}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
         # Return the specific order that was created
-        if order_id:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, customer_id, shipping_address_id, status, total_amount, order_date 
-                    FROM orders WHERE id = %s
-                """, (order_id,))
-                created_order = cursor.fetchone()
-                
-                if created_order:
-                    return {
-                        "id": created_order['id'],
-                        "customer_id": created_order['customer_id'],
-                        "shipping_address_id": created_order['shipping_address_id'],
-                        "status": created_order['status'],
-                        "total_amount": float(created_order['total_amount']),
-                        "order_date": created_order['order_date'].isoformat() if created_order['order_date'] else ''
-                    }
+        if created_order:
+            return {
+                "id": created_order['id'],
+                "customer_id": created_order['customer_id'],
+                "shipping_address_id": created_order['shipping_address_id'],
+                "status": created_order['status'],
+                "total_amount": float(created_order['total_amount']),
+                "order_date": created_order['order_date'].isoformat() if created_order['order_date'] else ''
+            }
         
         raise HTTPException(status_code=500, detail="Failed to retrieve created order")
 
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+
+Every schema change is a numbered migration recorded in ``schema_migrations``
+once applied. The runner is invoked out of band (release phase, deploy step
+or by hand), never while the API imports, so a cold start only pays for one
+``SELECT MAX(version)``.
+
+Usage:
+    python migrations.py status
+    python migrations.py plan [--target N]        # dry run with INSTANT/INPLACE/COPY per ALTER
+    python migrations.py migrate [--dry-run] [--target N]
+"""
+
+import logging
+import re
+import time
+
+import pymysql
+
+from catalog_cache import CREATE_CATALOG_VERSION_TABLE
+from email_outbox import CREATE_EMAIL_OUTBOX_TABLE
+from product_events import CREATE_PRODUCT_EVENTS_TABLE
+from image_presets import CREATE_PRODUCT_IMAGE_VARIANTS_TABLE, IMAGE_COLUMNS, image_variants
+from online_schema import (
+    COPY, ONLINE_REBUILD_MIN_ROWS, OnlineTableRebuild, classify_alter, parse_server_version
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_NAME = "trendyoft_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+CREATE_SCHEMA_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT UNSIGNED PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    execution_ms INT UNSIGNED
+) ENGINE=InnoDB;
+"""
+
+
+class Migration:
+    def __init__(self, version, description, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+    def __repr__(self):
+        return f"<Migration {self.version:04d} {self.description}>"
+
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register ``func(ctx)`` as schema migration ``version``"""
+    def register(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return register
+
+
+class MigrationContext:
+    """
+    What a migration sees: ``execute`` / ``alter_table`` for changes and the
+    ``*_exists`` helpers for idempotency checks. In dry-run mode changes are
+    only recorded in ``steps``; the read-only checks still hit the database,
+    so later migrations are planned against the schema as it is now.
+    """
+
+    def __init__(self, cursor, dry_run=False, online_min_rows=ONLINE_REBUILD_MIN_ROWS):
+        self.cursor = cursor
+        self.dry_run = dry_run
+        self.online_min_rows = online_min_rows
+        self.steps = []
+        self._server = None
+        self._dropped_foreign_keys = set()  # so dry runs plan against the post-drop schema
+
+    def _record(self, sql, algorithm=None, table=None, rows=None, chunked=False, note=None):
+        self.steps.append({
+            "sql": " ".join(sql.split()),
+            "algorithm": algorithm,
+            "table": table,
+            "rows": rows,
+            "chunked": chunked,
+            "note": note,
+        })
+
+    def execute(self, sql, params=None):
+        self._record(sql)
+        if not self.dry_run:
+            self.cursor.execute(sql, params)
+
+    def query(self, sql, params=None):
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall()
+
+    @property
+    def server(self):
+        """``(version_tuple, is_mariadb)`` of the connected server"""
+        if self._server is None:
+            self._server = parse_server_version(self.query("SELECT VERSION() AS version")[0]['version'])
+        return self._server
+
+    def table_rows(self, table):
+        """Estimated row count (InnoDB statistics, no table scan)"""
+        rows = self.query("""
+            SELECT TABLE_ROWS FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        return (rows[0]['TABLE_ROWS'] or 0) if rows else 0
+
+    def alter_table(self, table, *clauses, foreign_key_checks=True):
+        """
+        ALTER ``table`` with ``clauses``. Changes that would copy a table of
+        at least ``online_min_rows`` rows run as a chunked online rebuild
+        instead. ``foreign_key_checks=False`` skips validating new foreign
+        keys (check for orphans first), which keeps adding them in place.
+        """
+        version, mariadb = self.server
+        algorithm = classify_alter(clauses, version, mariadb, foreign_key_checks)
+        for clause in clauses:
+            dropped = re.match(r"\s*DROP FOREIGN KEY `?(\w+)`?", clause, re.IGNORECASE)
+            if dropped:
+                self._dropped_foreign_keys.add((table, dropped.group(1)))
+        rows = self.table_rows(table)
+        sql = f"ALTER TABLE {table} {', '.join(clauses)}"
+        note = None
+        if algorithm == COPY and rows >= self.online_min_rows:
+            if not self.has_foreign_keys(table):
+                rebuild = OnlineTableRebuild(self.cursor, table, clauses)
+                self._record(sql, algorithm, table, rows, chunked=True,
+                             note=f"shadow table {rebuild.shadow} + triggers, {rebuild.chunk_size} rows per chunk, atomic RENAME")
+                if not self.dry_run:
+                    rebuild.run()
+                return
+            note = "foreign keys prevent an online rebuild; writes block while the table is copied"
+            logger.warning(f"ALTER TABLE {table}: {note}")
+        self._record(sql, algorithm, table, rows, note=note)
+        if self.dry_run:
+            return
+        if foreign_key_checks:
+            self.cursor.execute(sql)
+            return
+        self.cursor.execute("SET SESSION foreign_key_checks = 0")
+        try:
+            self.cursor.execute(sql)
+        finally:
+            self.cursor.execute("SET SESSION foreign_key_checks = 1")
+
+    def table_exists(self, table):
+        return bool(self.query("""
+            SELECT 1 FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,)))
+
+    def column_exists(self, table, column):
+        return bool(self.query("""
+            SELECT 1 FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column)))
+
+    def index_exists(self, table, index):
+        return bool(self.query("""
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """, (table, index)))
+
+    def constraint_exists(self, table, constraint):
+        return bool(self.query("""
+            SELECT 1 FROM information_schema.TABLE_CONSTRAINTS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = %s
+        """, (table, constraint)))
+
+    def column_type(self, table, column):
+        rows = self.query("""
+            SELECT COLUMN_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column))
+        return rows[0]['COLUMN_TYPE'].lower() if rows else None
+
+    def has_foreign_keys(self, table):
+        """True if ``table`` has or is referenced by a foreign key"""
+        rows = self.query("""
+            SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+              AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)
+        """, (table, table))
+        return any((row['TABLE_NAME'], row['CONSTRAINT_NAME']) not in self._dropped_foreign_keys for row in rows)
+
+    def foreign_key_exists(self, table, column, referenced_table):
+        """Matches by column, so unnamed inline foreign keys count too"""
+        return bool(self.query("""
+            SELECT 1 FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+              AND REFERENCED_TABLE_NAME = %s
+        """, (table, column, referenced_table)))
+
+
+# Migrations
+
+@migration(1, "Create base tables")
+def create_base_tables(ctx):
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            first_name VARCHAR(100) NOT NULL,
+            last_name VARCHAR(100) NOT NULL,
+            phone_number VARCHAR(20) UNIQUE,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_email (email),
+            INDEX idx_phone (phone_number)
+        ) ENGINE=InnoDB
+    """)
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description TEXT,
+            price DECIMAL(15, 2) NOT NULL,
+            quantity INT NOT NULL DEFAULT 0,
+            category VARCHAR(100) NOT NULL,
+            image_full_url VARCHAR(500),
+            image_main_url VARCHAR(500),
+            image_thumb_url VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE,
+            INDEX idx_category (category),
+            INDEX idx_title (title),
+            INDEX idx_is_active (is_active)
+        ) ENGINE=InnoDB
+    """)
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS shipping_addresses (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            customer_id BIGINT UNSIGNED NOT NULL,
+            address_line1 VARCHAR(255) NOT NULL,
+            address_line2 VARCHAR(255),
+            city VARCHAR(100) NOT NULL,
+            country VARCHAR(100) NOT NULL,
+            zip_code VARCHAR(20) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+            INDEX idx_customer_id (customer_id)
+        ) ENGINE=InnoDB
+    """)
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            customer_id BIGINT UNSIGNED NOT NULL,
+            shipping_address_id BIGINT UNSIGNED NOT NULL,
+            status ENUM('pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled') DEFAULT 'pending',
+            total_amount DECIMAL(15, 2) NOT NULL,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+            FOREIGN KEY (shipping_address_id) REFERENCES shipping_addresses(id) ON DELETE RESTRICT,
+            INDEX idx_customer_id (customer_id),
+            INDEX idx_status (status),
+            INDEX idx_order_date (order_date)
+        ) ENGINE=InnoDB
+    """)
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS payment_details (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            order_id BIGINT UNSIGNED NOT NULL,
+            payment_provider VARCHAR(50) NOT NULL,
+            payment_id VARCHAR(255) NOT NULL,
+            status ENUM('pending', 'completed', 'failed', 'refunded') DEFAULT 'pending',
+            currency VARCHAR(3) DEFAULT 'USD',
+            amount DECIMAL(10, 2) NOT NULL,
+            payment_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+            INDEX idx_order_id (order_id),
+            INDEX idx_payment_id (payment_id),
+            INDEX idx_status (status)
+        ) ENGINE=InnoDB
+    """)
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            username VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_email (email)
+        ) ENGINE=InnoDB
+    """)
+    ctx.execute("""
+        CREATE TABLE IF NOT EXISTS order_items (
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            order_id BIGINT UNSIGNED NOT NULL,
+            product_id BIGINT UNSIGNED NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            INDEX idx_order_id (order_id),
+            INDEX idx_product_id (product_id)
+        ) ENGINE=InnoDB
+    """)
+
+
+@migration(2, "Add order_items foreign keys")
+def add_order_items_foreign_keys(ctx):
+    # Old INT-keyed schemas cannot take these yet; migrations 7 and 8 handle them
+    if not ctx.foreign_key_exists("order_items", "order_id", "orders") \
+            and ctx.column_type("order_items", "order_id") == ctx.column_type("orders", "id"):
+        ctx.alter_table("order_items", """
+            ADD CONSTRAINT fk_order_items_order_id
+            FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+        """)
+    if not ctx.foreign_key_exists("order_items", "product_id", "products") \
+            and ctx.column_type("order_items", "product_id") == ctx.column_type("products", "id"):
+        ctx.alter_table("order_items", """
+            ADD CONSTRAINT fk_order_items_product_id
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE RESTRICT
+        """)
+
+
+@migration(3, "Widen orders.total_amount to DECIMAL(15, 2)")
+def widen_order_total(ctx):
+    rows = ctx.query("""
+        SELECT NUMERIC_PRECISION FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'orders' AND COLUMN_NAME = 'total_amount'
+    """)
+    if rows and rows[0]['NUMERIC_PRECISION'] < 15:
+        ctx.alter_table("orders", "MODIFY COLUMN total_amount DECIMAL(15, 2) NOT NULL")
+
+
+@migration(4, "Add customers.username")
+def add_customer_username(ctx):
+    if not ctx.column_exists("customers", "username"):
+        ctx.alter_table("customers", "ADD COLUMN username VARCHAR(100) AFTER last_name")
+
+
+@migration(5, "Add product listing indexes")
+def add_product_listing_indexes(ctx):
+    if not ctx.index_exists("products", "idx_products_active"):
+        ctx.alter_table("products", "ADD INDEX idx_products_active (is_active)")
+    if not ctx.index_exists("products", "idx_products_category_active"):
+        ctx.alter_table("products", "ADD INDEX idx_products_category_active (category, is_active)")
+
+
+@migration(6, "Create email_outbox")
+def create_email_outbox(ctx):
+    ctx.execute(CREATE_EMAIL_OUTBOX_TABLE)
+
+
+# Every primary and foreign key column, as the base tables define them.
+# Databases set up by the old migrate_to_railway.py / fix_database_schema.py
+# scripts have INT keys on some of these.
+KEY_COLUMNS = {
+    "customers": ["id"],
+    "products": ["id"],
+    "users": ["id"],
+    "shipping_addresses": ["id", "customer_id"],
+    "orders": ["id", "customer_id", "shipping_address_id"],
+    "payment_details": ["id", "order_id"],
+    "order_items": ["id", "order_id", "product_id"],
+}
+
+# (constraint name, table, column, referenced table, ON DELETE)
+FOREIGN_KEYS = [
+    ("fk_shipping_addresses_customer_id", "shipping_addresses", "customer_id", "customers", "CASCADE"),
+    ("fk_orders_customer_id", "orders", "customer_id", "customers", "CASCADE"),
+    ("fk_orders_shipping_address_id", "orders", "shipping_address_id", "shipping_addresses", "RESTRICT"),
+    ("fk_payment_details_order_id", "payment_details", "order_id", "orders", "CASCADE"),
+    ("fk_order_items_order_id", "order_items", "order_id", "orders", "CASCADE"),
+    ("fk_order_items_product_id", "order_items", "product_id", "products", "RESTRICT"),
+]
+
+
+@migration(7, "Normalize key columns to BIGINT UNSIGNED")
+def normalize_key_columns(ctx):
+    mismatched = {}
+    for table, columns in KEY_COLUMNS.items():
+        for row in ctx.query(f"""
+            SELECT COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+              AND COLUMN_NAME IN ({", ".join(["%s"] * len(columns))})
+        """, [table] + columns):
+            column_type = row['COLUMN_TYPE'].lower()
+            if not (column_type.startswith("bigint") and "unsigned" in column_type):
+                mismatched.setdefault(table, []).append(row['COLUMN_NAME'])
+    if not mismatched:
+        return
+
+    # Both ends of a foreign key must change type together, so drop every
+    # foreign key touching these tables; migration 8 adds them all back
+    tables = list(mismatched)
+    placeholders = ", ".join(["%s"] * len(tables))
+    for row in ctx.query(f"""
+        SELECT DISTINCT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+          AND (TABLE_NAME IN ({placeholders}) OR REFERENCED_TABLE_NAME IN ({placeholders}))
+    """, tables + tables):
+        ctx.alter_table(row['TABLE_NAME'], f"DROP FOREIGN KEY `{row['CONSTRAINT_NAME']}`")
+
+    for table, columns in mismatched.items():
+        ctx.alter_table(table, *[
+            f"MODIFY COLUMN `{column}` BIGINT UNSIGNED NOT NULL" + (" AUTO_INCREMENT" if column == "id" else "")
+            for column in columns
+        ])
+
+
+@migration(8, "Ensure foreign keys")
+def ensure_foreign_keys(ctx):
+    missing = {}
+    for name, table, column, referenced, on_delete in FOREIGN_KEYS:
+        if ctx.foreign_key_exists(table, column, referenced):
+            continue
+        orphans = ctx.query(f"""
+            SELECT COUNT(*) AS orphans FROM `{table}` child
+            LEFT JOIN `{referenced}` parent ON parent.id = child.`{column}`
+            WHERE parent.id IS NULL
+        """)[0]['orphans']
+        if orphans:
+            raise RuntimeError(
+                f"{orphans} rows in {table}.{column} reference missing {referenced} rows; "
+                f"clean them up before adding {name}"
+            )
+        missing.setdefault(table, []).append(
+            f"ADD CONSTRAINT `{name}` FOREIGN KEY (`{column}`) REFERENCES `{referenced}`(id) ON DELETE {on_delete}"
+        )
+    # Rows were validated above, so skip the server-side check that would copy the table
+    for table, clauses in missing.items():
+        ctx.alter_table(table, *clauses, foreign_key_checks=False)
+
+
+@migration(9, "Add payment_details.currency")
+def add_payment_currency(ctx):
+    if not ctx.column_exists("payment_details", "currency"):
+        ctx.alter_table("payment_details", "ADD COLUMN currency VARCHAR(3) DEFAULT 'USD'")
+
+
+@migration(10, "Create catalog_version")
+def create_catalog_version(ctx):
+    ctx.execute(CREATE_CATALOG_VERSION_TABLE)
+    ctx.execute("INSERT IGNORE INTO catalog_version (id, version) VALUES (1, 1)")
+
+
+@migration(11, "Index products (is_active, id) for keyset pagination")
+def add_products_keyset_index(ctx):
+    # Listing pages seek with "is_active = TRUE AND id < cursor ORDER BY id DESC";
+    # the composite index serves that as a range scan. It also covers is_active
+    # alone, so the two single-column duplicates go.
+    clauses = []
+    if not ctx.index_exists("products", "idx_products_active_id"):
+        clauses.append("ADD INDEX idx_products_active_id (is_active, id)")
+    for index in ("idx_is_active", "idx_products_active"):
+        if ctx.index_exists("products", index):
+            clauses.append(f"DROP INDEX {index}")
+    if clauses:
+        ctx.alter_table("products", *clauses)
+
+
+BACKFILL_BATCH_SIZE = 500
+
+
+@migration(12, "Create product_image_variants and backfill image presets")
+def create_product_image_variants(ctx):
+    # No foreign key to products: products are only soft-deleted, and a
+    # reference would stop online rebuilds of the products table
+    ctx.execute(CREATE_PRODUCT_IMAGE_VARIANTS_TABLE)
+    last_id = 0
+    while True:
+        products = ctx.query(f"""
+            SELECT id, {", ".join(IMAGE_COLUMNS)} FROM products
+            WHERE id > %s ORDER BY id LIMIT %s
+        """, (last_id, BACKFILL_BATCH_SIZE))
+        if not products:
+            break
+        last_id = products[-1]['id']
+        rows = [
+            (product['id'], preset, url)
+            for product in products
+            for preset, url in image_variants(product).items()
+        ]
+        if rows:
+            ctx.execute(
+                "INSERT INTO product_image_variants (product_id, preset, url) VALUES "
+                + ", ".join(["(%s, %s, %s)"] * len(rows))
+                + " ON DUPLICATE KEY UPDATE url = VALUES(url)",
+                [value for row in rows for value in row]
+            )
+
+
+@migration(13, "Create product_events")
+def create_product_events(ctx):
+    ctx.execute(CREATE_PRODUCT_EVENTS_TABLE)
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# Runner
+
+def schema_version(conn):
+    """Highest applied migration, 0 on a database that was never migrated"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(version) AS version FROM schema_migrations")
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] == 1146:  # ER_NO_SUCH_TABLE
+            return 0
+        raise
+    row = cursor.fetchone()
+    return row['version'] or 0
+
+
+def check_schema_version(conn):
+    """Cheap startup check: compare the database against the code's migrations"""
+    current = schema_version(conn)
+    if current < LATEST_VERSION:
+        logger.warning(
+            f"Database schema is at version {current}, code expects {LATEST_VERSION}; "
+            f"run 'python migrations.py migrate'"
+        )
+    elif current > LATEST_VERSION:
+        logger.warning(f"Database schema version {current} is newer than this code ({LATEST_VERSION})")
+    return {"current": current, "latest": LATEST_VERSION, "pending": max(0, LATEST_VERSION - current)}
+
+
+def applied_versions(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version FROM schema_migrations")
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] == 1146:
+            return set()
+        raise
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def migrate(conn, target=None, dry_run=False):
+    """
+    Apply pending migrations up to ``target`` (default: all), in order.
+
+    MySQL commits DDL implicitly, so each migration is recorded right after
+    it runs and migrations are written to be safe to re-run. A named lock
+    keeps two deploys from migrating at the same time. Returns
+    ``(migration, steps)`` pairs for what was (or, on a dry run, would be)
+    applied; see ``MigrationContext.steps``.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+    if not cursor.fetchone()['acquired']:
+        raise RuntimeError("Another process is running migrations")
+    try:
+        if not dry_run:
+            cursor.execute(CREATE_SCHEMA_MIGRATIONS_TABLE)
+        applied = applied_versions(conn)
+
+        results = []
+        for pending in MIGRATIONS:
+            if pending.version in applied or (target is not None and pending.version > target):
+                continue
+            ctx = MigrationContext(cursor, dry_run=dry_run)
+            started = time.perf_counter()
+            pending.apply(ctx)
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            if not dry_run:
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description, execution_ms) VALUES (%s, %s, %s)",
+                    (pending.version, pending.description, elapsed_ms)
+                )
+                conn.commit()
+                logger.info(f"Applied migration {pending.version}: {pending.description} ({elapsed_ms} ms)")
+            results.append((pending, ctx.steps))
+        return results
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+
+
+def describe_step(step):
+    """One line of migration output: the predicted algorithm, table size and SQL"""
+    if step['algorithm'] is None:
+        return f"    {step['sql']}"
+    how = "ONLINE" if step['chunked'] else step['algorithm']
+    line = f"    [{how:<7}] ~{step['rows']} rows  {step['sql']}"
+    if not step['note']:
+        return line
+    marker = "↳" if step['chunked'] else "⚠️ "
+    return f"{line}\n              {marker} {step['note']}"
+
+
+def main():
+    import argparse
+    from main import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Apply or inspect schema migrations")
+    parser.add_argument("command", choices=["status", "plan", "migrate"], nargs="?", default="status")
+    parser.add_argument("--dry-run", action="store_true", help="print the statements instead of running them")
+    parser.add_argument("--target", type=int, default=None, help="stop after this migration version")
+    args = parser.parse_args()
+    dry_run = args.dry_run or args.command == "plan"
+
+    logging.basicConfig(level=logging.INFO)
+    # DDL and chunked copies outlive the API's 10 second query timeouts
+    conn = pymysql.connect(**{**DB_CONFIG, 'read_timeout': None, 'write_timeout': None})
+    try:
+        if args.command == "status":
+            applied = applied_versions(conn)
+            print(f"📋 Schema version {schema_version(conn)} (latest {LATEST_VERSION})")
+            for m in MIGRATIONS:
+                marker = "✅" if m.version in applied else "⏳"
+                print(f"   {marker} {m.version:04d} {m.description}")
+            return
+
+        results = migrate(conn, target=args.target, dry_run=dry_run)
+        if not results:
+            print("✅ Schema is up to date")
+        for applied, steps in results:
+            verb = "Would apply" if dry_run else "Applied"
+            print(f"{verb} {applied.version:04d} {applied.description}")
+            for step in steps:
+                print(describe_step(step))
+        if dry_run:
+            steps = [step for _, migration_steps in results for step in migration_steps]
+            copies = [step for step in steps if step['algorithm'] == COPY]
+            online = [step for step in copies if step['chunked']]
+            print(f"\n📋 {len(copies)} ALTERs need a table copy, {len(online)} of them run as chunked online rebuilds "
+                  f"(tables with {ONLINE_REBUILD_MIN_ROWS}+ rows)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
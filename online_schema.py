@@ -0,0 +1,196 @@
+"""
+Online schema change helpers used by the migrations.
+
+- ``classify_alter`` predicts which algorithm MySQL will use for an ALTER
+  (INSTANT: metadata only, INPLACE: no table copy and concurrent DML allowed,
+  COPY: the table is rebuilt and writes block until it finishes). The rules
+  are deliberately conservative: anything not known to be cheaper is COPY.
+- ``OnlineTableRebuild`` applies a COPY-class change to a large table the way
+  pt-online-schema-change does: build a shadow table with the new definition,
+  keep it in sync with triggers, backfill it in small primary-key chunks, then
+  swap the two with one atomic RENAME TABLE.
+"""
+
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+INSTANT = "INSTANT"
+INPLACE = "INPLACE"
+COPY = "COPY"
+_ALGORITHM_COST = {INSTANT: 0, INPLACE: 1, COPY: 2}
+
+# COPY-class changes on tables with at least this many rows (estimated) are
+# run as chunked online rebuilds instead of a plain ALTER TABLE
+ONLINE_REBUILD_MIN_ROWS = int(os.getenv("ONLINE_REBUILD_MIN_ROWS", 50000))
+CHUNK_SIZE = int(os.getenv("ONLINE_REBUILD_CHUNK_SIZE", 1000))
+CHUNK_PAUSE = float(os.getenv("ONLINE_REBUILD_CHUNK_PAUSE", 0.05))
+
+
+def parse_server_version(version_string):
+    """``'8.0.35'`` -> ``((8, 0, 35), False)``; the flag is True for MariaDB"""
+    match = re.match(r"(\d+)\.(\d+)\.(\d+)", version_string or "")
+    version = tuple(int(part) for part in match.groups()) if match else (0, 0, 0)
+    return version, "mariadb" in (version_string or "").lower()
+
+
+def classify_clause(clause, server_version=(8, 0, 0), mariadb=False, foreign_key_checks=True):
+    """Algorithm MySQL will use for one ALTER TABLE clause"""
+    c = " ".join(clause.upper().split())
+    if re.match(r"ADD (CONSTRAINT \S+ )?FOREIGN KEY", c):
+        # Validating existing rows forces a copy; with checks off it is in place
+        return COPY if foreign_key_checks else INPLACE
+    if c.startswith("DROP FOREIGN KEY"):
+        return INPLACE
+    if re.match(r"(ADD|DROP) (UNIQUE |FULLTEXT |SPATIAL )?(INDEX|KEY)\b", c) or c.startswith("RENAME INDEX"):
+        return INPLACE
+    if re.match(r"ADD PRIMARY KEY|DROP PRIMARY KEY", c):
+        return COPY
+    if re.match(r"ADD (COLUMN )?", c):
+        positional = " AFTER " in c or c.endswith(" FIRST")
+        if mariadb:
+            instant = server_version >= (10, 4, 0) or (server_version >= (10, 3, 2) and not positional)
+        else:
+            instant = server_version >= (8, 0, 29) or (server_version >= (8, 0, 12) and not positional)
+        return INSTANT if instant else INPLACE
+    if re.match(r"ALTER (COLUMN )?\S+ (SET|DROP) DEFAULT", c):
+        return INSTANT
+    if c.startswith("RENAME COLUMN"):
+        return INSTANT if (mariadb or server_version >= (8, 0, 28)) else INPLACE
+    # MODIFY / CHANGE COLUMN (type changes), engine or charset conversions, ...
+    return COPY
+
+
+def classify_alter(clauses, server_version=(8, 0, 0), mariadb=False, foreign_key_checks=True):
+    """Algorithm for a whole ALTER TABLE: the most expensive of its clauses"""
+    algorithms = [classify_clause(c, server_version, mariadb, foreign_key_checks) for c in clauses]
+    return max(algorithms, key=_ALGORITHM_COST.get, default=INSTANT)
+
+
+class OnlineTableRebuild:
+    """
+    Rebuild ``table`` with ``clauses`` applied while it keeps taking writes.
+
+    The table must have a single-column ``id`` primary key and no foreign keys
+    in either direction (CREATE TABLE ... LIKE does not copy them and RENAME
+    would carry references over to the old table): drop them first and add
+    them back afterwards. Only widening changes are safe, since rows are
+    copied with INSERT IGNORE.
+    """
+
+    def __init__(self, cursor, table, clauses, chunk_size=CHUNK_SIZE, chunk_pause=CHUNK_PAUSE):
+        self.cursor = cursor
+        self.table = table
+        self.clauses = list(clauses)
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.shadow = f"_{table}_new"
+        self.old = f"_{table}_old"
+        self.triggers = {op: f"_{table}_osc_{op}" for op in ("ins", "upd", "del")}
+
+    def _query(self, sql, params=None):
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall()
+
+    def _commit(self):
+        self.cursor.connection.commit()
+
+    def _check_preconditions(self):
+        primary = self._query("""
+            SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY'
+        """, (self.table,))
+        if [row['COLUMN_NAME'] for row in primary] != ['id']:
+            raise RuntimeError(f"Online rebuild of {self.table} needs a single-column id primary key")
+        foreign_keys = self._query("""
+            SELECT CONSTRAINT_NAME, TABLE_NAME FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+              AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)
+        """, (self.table, self.table))
+        if foreign_keys:
+            names = ", ".join(f"{row['TABLE_NAME']}.{row['CONSTRAINT_NAME']}" for row in foreign_keys)
+            raise RuntimeError(f"Drop foreign keys before rebuilding {self.table}: {names}")
+
+    def _shared_columns(self):
+        rows = self._query("""
+            SELECT n.COLUMN_NAME FROM information_schema.COLUMNS n
+            JOIN information_schema.COLUMNS o
+              ON o.TABLE_SCHEMA = n.TABLE_SCHEMA AND o.TABLE_NAME = %s AND o.COLUMN_NAME = n.COLUMN_NAME
+            WHERE n.TABLE_SCHEMA = DATABASE() AND n.TABLE_NAME = %s
+            ORDER BY n.ORDINAL_POSITION
+        """, (self.table, self.shadow))
+        return [row['COLUMN_NAME'] for row in rows]
+
+    def _create_triggers(self, columns):
+        column_list = ", ".join(f"`{c}`" for c in columns)
+        new_values = ", ".join(f"NEW.`{c}`" for c in columns)
+        self.cursor.execute(f"""
+            CREATE TRIGGER `{self.triggers['ins']}` AFTER INSERT ON `{self.table}` FOR EACH ROW
+            REPLACE INTO `{self.shadow}` ({column_list}) VALUES ({new_values})
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER `{self.triggers['upd']}` AFTER UPDATE ON `{self.table}` FOR EACH ROW
+            BEGIN
+                DELETE IGNORE FROM `{self.shadow}` WHERE id = OLD.id;
+                REPLACE INTO `{self.shadow}` ({column_list}) VALUES ({new_values});
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER `{self.triggers['del']}` AFTER DELETE ON `{self.table}` FOR EACH ROW
+            DELETE IGNORE FROM `{self.shadow}` WHERE id = OLD.id
+        """)
+
+    def _drop_triggers(self):
+        for trigger in self.triggers.values():
+            self.cursor.execute(f"DROP TRIGGER IF EXISTS `{trigger}`")
+
+    def _copy_chunks(self, columns):
+        column_list = ", ".join(f"`{c}`" for c in columns)
+        self.cursor.execute(f"SELECT MIN(id) AS low, MAX(id) AS high FROM `{self.table}`")
+        bounds = self.cursor.fetchone()
+        if bounds['low'] is None:
+            return 0
+        copied, chunks = 0, 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            end = start + self.chunk_size - 1
+            self.cursor.execute(f"""
+                INSERT IGNORE INTO `{self.shadow}` ({column_list})
+                SELECT {column_list} FROM `{self.table}`
+                WHERE id BETWEEN %s AND %s
+                LOCK IN SHARE MODE
+            """, (start, end))
+            copied += self.cursor.rowcount
+            self._commit()
+            chunks += 1
+            if chunks % 100 == 0:
+                logger.info(f"Online rebuild of {self.table}: copied up to id {end} of {bounds['high']}")
+            start = end + 1
+            if self.chunk_pause:
+                time.sleep(self.chunk_pause)
+        return copied
+
+    def run(self):
+        """Returns the number of rows backfilled by the chunked copy"""
+        self._check_preconditions()
+        self.cursor.execute(f"DROP TABLE IF EXISTS `{self.shadow}`")
+        self.cursor.execute(f"CREATE TABLE `{self.shadow}` LIKE `{self.table}`")
+        self.cursor.execute(f"ALTER TABLE `{self.shadow}` {', '.join(self.clauses)}")
+        try:
+            columns = self._shared_columns()
+            self._create_triggers(columns)
+            copied = self._copy_chunks(columns)
+            self.cursor.execute(
+                f"RENAME TABLE `{self.table}` TO `{self.old}`, `{self.shadow}` TO `{self.table}`"
+            )
+        except Exception:
+            self._drop_triggers()
+            self.cursor.execute(f"DROP TABLE IF EXISTS `{self.shadow}`")
+            raise
+        self._drop_triggers()
+        self.cursor.execute(f"DROP TABLE IF EXISTS `{self.old}`")
+        logger.info(f"Online rebuild of {self.table} finished: {copied} rows copied")
+        return copied
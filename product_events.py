@@ -0,0 +1,336 @@
+"""
+Live product change feed (Server-Sent Events).
+
+Product writes and order stock decrements INSERT into ``product_events``
+inside their own transaction, so an event exists if and only if its change
+committed, whichever worker made it. Each worker runs one poller, only
+while it has subscribers, that reads new events by id and fans them out to
+its SSE connections through bounded queues. An idle connection costs a
+queue and a parked coroutine; the database sees one query per poll per
+worker, however many clients are connected.
+
+A subscriber whose queue fills up is disconnected; the browser reconnects
+with ``Last-Event-ID`` and the missed events are replayed from the table.
+Events carry the product's quantity as written rather than a delta, so a
+replayed or repeated event is harmless.
+
+Events older than the retention period are pruned by the writers (see
+``ProductEventBroker.prune_if_due``), so the table stays bounded whether or
+not anyone is subscribed.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+CREATE_PRODUCT_EVENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS product_events (
+    id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    product_id BIGINT UNSIGNED NOT NULL,
+    event_type ENUM('created', 'updated', 'deleted', 'stock') NOT NULL,
+    quantity INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB;
+"""
+
+POLL_INTERVAL = float(os.getenv("PRODUCT_EVENTS_POLL_INTERVAL", 1))
+QUEUE_SIZE = int(os.getenv("PRODUCT_EVENTS_QUEUE_SIZE", 256))
+REPLAY_LIMIT = int(os.getenv("PRODUCT_EVENTS_REPLAY_LIMIT", 1000))
+RETENTION_HOURS = int(os.getenv("PRODUCT_EVENTS_RETENTION_HOURS", 24))
+HEARTBEAT_INTERVAL = float(os.getenv("PRODUCT_EVENTS_HEARTBEAT_INTERVAL", 15))
+BATCH_SIZE = 500
+PRUNE_INTERVAL = 600
+# How long a missing id below delivered events is waited for: its
+# transaction may commit after later ones, or it may never exist
+GAP_TIMEOUT = 5
+RECONNECT_MS = 3000
+
+
+def record_product_events(cursor, event_type, product_ids):
+    """
+    Record ``event_type`` for ``product_ids`` using the caller's cursor (and
+    therefore its transaction), with each product's quantity as written.
+    """
+    if not product_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    try:
+        cursor.execute(f"""
+            INSERT INTO product_events (product_id, event_type, quantity)
+            SELECT id, %s, quantity FROM products WHERE id IN ({placeholders})
+        """, [event_type] + list(product_ids))
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+            raise
+        logger.warning("product_events table is missing; run 'python migrations.py migrate'")
+
+
+def read_events(cursor, after_id, limit, up_to=None):
+    cursor.execute(f"""
+        SELECT id, product_id, event_type, quantity, UNIX_TIMESTAMP(created_at) AS created_at
+        FROM product_events
+        WHERE id > %s {"AND id <= %s" if up_to is not None else ""}
+        ORDER BY id
+        LIMIT %s
+    """, [after_id] + ([up_to] if up_to is not None else []) + [limit])
+    return cursor.fetchall()
+
+
+def latest_event_id(cursor):
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS id FROM product_events")
+    return cursor.fetchone()['id']
+
+
+def prune_events(cursor, retention_hours=RETENTION_HOURS):
+    cursor.execute(
+        "DELETE FROM product_events WHERE created_at < NOW() - INTERVAL %s HOUR LIMIT 10000",
+        (retention_hours,)
+    )
+    return cursor.rowcount
+
+
+def format_event(row):
+    """One SSE message (bytes), shared by every subscriber"""
+    data = {
+        "id": row['id'],
+        "product_id": row['product_id'],
+        "type": row['event_type'],
+        "quantity": row['quantity'],
+        "stock_status": None if row['quantity'] is None else ('In Stock' if row['quantity'] > 0 else 'Out of Stock'),
+        "at": float(row['created_at']) if row['created_at'] is not None else None,
+    }
+    return f"id: {row['id']}\nevent: product\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+# Tells the client its copy may have missed events: refetch /products/
+RESET_MESSAGE = b"event: reset\ndata: {}\n\n"
+HEARTBEAT_MESSAGE = b": keepalive\n\n"
+
+
+class Subscription:
+    __slots__ = ("queue", "resume_from", "replay_up_to")
+
+    def __init__(self, queue_size, resume_from, replay_up_to):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.resume_from = resume_from
+        self.replay_up_to = replay_up_to
+
+
+class ProductEventBroker:
+    """
+    Fans ``product_events`` out to this worker's SSE subscribers.
+
+    ``connection_factory`` is a context manager factory yielding a database
+    connection and ``run_blocking`` an awaitable runner for blocking calls.
+    ``on_event(row)`` is called for every new event, e.g. to invalidate
+    local caches.
+    """
+
+    def __init__(self, connection_factory, run_blocking, poll_interval=POLL_INTERVAL, queue_size=QUEUE_SIZE,
+                 on_event=None):
+        self.connection_factory = connection_factory
+        self.run_blocking = run_blocking
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.on_event = on_event
+
+        self._subscribers = set()
+        self._task = None
+        self._loop = None
+        self._wake_event = None
+        self._start_lock = None
+        # Every id <= _horizon has been delivered (or given up on); _delivered
+        # holds the ids above it, which may have gaps below them
+        self._horizon = None
+        self._delivered = set()
+        self._gap_since = None
+        self._prune_lock = threading.Lock()
+        self._last_prune = None
+
+        self._events = 0
+        self._dropped_subscribers = 0
+        self._poll_errors = 0
+
+    def _with_cursor(self, func, *args):
+        with self.connection_factory() as conn:
+            return func(conn.cursor(), *args)
+
+    async def subscribe(self, last_event_id=None):
+        """
+        Register a subscriber, starting the poller if needed. With
+        ``last_event_id`` the events after it are replayed by ``stream``.
+        """
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._task is None or self._task.done():
+                self._horizon = await self.run_blocking(self._with_cursor, latest_event_id)
+                self._delivered.clear()
+                self._gap_since = None
+                self._loop = asyncio.get_running_loop()
+                self._wake_event = asyncio.Event()
+                self._task = self._loop.create_task(self._run())
+        up_to = max(self._delivered, default=self._horizon)
+        subscription = Subscription(self.queue_size, last_event_id, up_to)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    async def stream(self, subscription):
+        """SSE byte chunks for ``subscription``: replay, then live events with heartbeats"""
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n".encode()
+            if subscription.resume_from is not None and subscription.resume_from < subscription.replay_up_to:
+                rows = await self.run_blocking(
+                    self._with_cursor, read_events, subscription.resume_from, REPLAY_LIMIT + 1,
+                    subscription.replay_up_to
+                )
+                if len(rows) > REPLAY_LIMIT:
+                    yield RESET_MESSAGE
+                else:
+                    for row in rows:
+                        yield format_event(row)
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT_MESSAGE
+                    continue
+                if message is None:
+                    return  # fell behind: the client reconnects and replays
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def _publish(self, message):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._subscribers.discard(subscription)
+                self._dropped_subscribers += 1
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+
+    def _deliver(self, rows):
+        for row in rows:
+            if row['id'] in self._delivered:
+                continue
+            self._delivered.add(row['id'])
+            self._events += 1
+            if self.on_event is not None:
+                try:
+                    self.on_event(row)
+                except Exception as e:
+                    logger.error(f"product event callback failed: {e}")
+            self._publish(format_event(row))
+
+        # Advance the horizon over consecutive ids; wait a while on gaps
+        now = time.monotonic()
+        while self._delivered:
+            if self._horizon + 1 in self._delivered:
+                self._horizon += 1
+                self._delivered.discard(self._horizon)
+                self._gap_since = None
+            elif self._gap_since is None:
+                self._gap_since = now
+                break
+            elif now - self._gap_since >= GAP_TIMEOUT:
+                self._horizon = min(self._delivered) - 1
+                self._gap_since = None
+            else:
+                break
+
+    def _poll(self, horizon):
+        return self._with_cursor(read_events, horizon, BATCH_SIZE)
+
+    async def _run(self):
+        logger.info("Product event poller started")
+        while self._subscribers:
+            self._wake_event.clear()
+            try:
+                rows = await self.run_blocking(self._poll, self._horizon)
+                self._deliver(rows)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._poll_errors += 1
+                logger.error(f"Polling product events failed: {e}")
+                rows = []
+            if len(rows) >= BATCH_SIZE and len(self._delivered) < BATCH_SIZE:
+                continue  # more events are probably waiting
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        logger.info("Product event poller stopped (no subscribers)")
+
+    def wake(self):
+        """Poll now, e.g. right after this worker committed a change (safe from any thread)"""
+        if self._loop is not None and self._wake_event is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    def prune_due(self):
+        """Whether ``prune_if_due`` would prune now (cheap, no database access)"""
+        return self._last_prune is None or time.monotonic() - self._last_prune >= PRUNE_INTERVAL
+
+    def prune_if_due(self):
+        """
+        Delete events older than RETENTION_HOURS, at most once per
+        PRUNE_INTERVAL per process. Blocking and checks out its own
+        connection, so run it as a task of its own, not while holding one.
+        Returns how many rows were deleted.
+        """
+        now = time.monotonic()
+        if not self.prune_due():
+            return 0
+        if not self._prune_lock.acquire(blocking=False):
+            return 0  # another thread is pruning
+        try:
+            self._last_prune = now
+            with self.connection_factory() as conn:
+                pruned = prune_events(conn.cursor())
+                conn.commit()
+            if pruned:
+                logger.info(f"Pruned {pruned} product events older than {RETENTION_HOURS}h")
+            return pruned
+        except Exception as e:
+            logger.error(f"Pruning product events failed: {e}")
+            return 0
+        finally:
+            self._prune_lock.release()
+
+    async def stop(self):
+        for subscription in list(self._subscribers):
+            self._subscribers.discard(subscription)
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(None)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "polling": self._task is not None and not self._task.done(),
+            "last_event_id": max(self._delivered, default=self._horizon),
+            "events": self._events,
+            "dropped_subscribers": self._dropped_subscribers,
+            "poll_errors": self._poll_errors,
+        }
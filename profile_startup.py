@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Measure the API's cold start so it can be tracked as a number.
+
+- Import time: imports ``main`` in a fresh interpreter under
+  ``python -X importtime`` and reports the total plus the most expensive
+  packages (self time of all their modules added up).
+- Time to first response: starts uvicorn in a fresh process and polls
+  ``--path`` until the first HTTP response arrives.
+
+Each measurement runs in a new process, so results include interpreter
+startup but nothing is warm from earlier runs.
+
+Usage:
+    python profile_startup.py [--runs 3] [--top 15] [--path /api] [--json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_imports(module="main"):
+    """Returns (total_ms, {package: self_ms}) for importing ``module``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    total_us = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # column header
+        name = fields[2].strip()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us / 1000
+        if name == module:
+            total_us = cumulative_us
+    return total_us / 1000, packages
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_response(path="/api", timeout=60):
+    """Seconds from spawning uvicorn until the first response to ``path``"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    response.read()
+                    return time.perf_counter() - started, response.status
+            except urllib.error.HTTPError as e:
+                return time.perf_counter() - started, e.code  # an error page is still a response
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {server.returncode} before responding")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"No response from {url} after {timeout}s")
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="packages to list by import time")
+    parser.add_argument("--path", default="/api", help="endpoint polled for time-to-first-response")
+    parser.add_argument("--skip-server", action="store_true", help="only measure imports")
+    parser.add_argument("--json", action="store_true", help="print one JSON object (for tracking over time)")
+    args = parser.parse_args()
+
+    import_runs = [measure_imports() for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _ in import_runs)
+    packages = {}
+    for _, run in import_runs:
+        for package, ms in run.items():
+            packages.setdefault(package, []).append(ms)
+    slowest = sorted(((statistics.median(v), k) for k, v in packages.items()), reverse=True)[:args.top]
+
+    first_response_ms = None
+    status_code = None
+    if not args.skip_server:
+        responses = [measure_first_response(args.path) for _ in range(args.runs)]
+        first_response_ms = statistics.median(seconds for seconds, _ in responses) * 1000
+        status_code = responses[-1][1]
+
+    if args.json:
+        print(json.dumps({
+            "import_main_ms": round(import_ms, 1),
+            "first_response_ms": round(first_response_ms, 1) if first_response_ms is not None else None,
+            "first_response_status": status_code,
+            "packages_ms": {name: round(ms, 1) for ms, name in slowest},
+        }))
+        return
+
+    print(f"⏱️  import main: {import_ms:.1f} ms (median of {args.runs})")
+    print("-" * 48)
+    for ms, name in slowest:
+        print(f"   {name:<32} {ms:>8.1f} ms")
+    print("-" * 48)
+    if first_response_ms is not None:
+        print(f"🚀 first response from {args.path}: {first_response_ms:.1f} ms (HTTP {status_code}, "
+              f"median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
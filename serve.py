@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Production launcher: gunicorn managing uvicorn workers.
+
+- The app is imported once in the master before forking (``preload_app``),
+  so every worker shares the imported modules copy-on-write and a broken
+  build fails before any worker starts. The connection pool, database
+  executor and SMTP session are created lazily per process, so nothing
+  opened in the master leaks into the workers.
+- Worker count comes from WEB_CONCURRENCY when set, otherwise from the CPUs
+  and memory this container may use, capped so that ``workers x
+  DB_POOL_MAX_SIZE`` stays under DB_MAX_CONNECTIONS.
+- Workers use uvloop and httptools when they are installed.
+- ``python serve.py reload`` swaps in new code without dropping requests:
+  the master is re-executed (USR2), and once the new master is up the old
+  one is asked to stop gracefully (TERM), which lets in-flight checkouts
+  finish within GRACEFUL_TIMEOUT.
+
+Usage:
+    python serve.py [run] [--bind 0.0.0.0:8000] [--workers N]
+    python serve.py reload
+    python serve.py workers     # print the sizing decision and exit
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import signal
+import sys
+import time
+
+from database import pool_settings_from_env
+
+logger = logging.getLogger("serve")
+
+APP = os.getenv("APP_MODULE", "main:app")
+PIDFILE = os.getenv("GUNICORN_PIDFILE", "/tmp/trendyoft-gunicorn.pid")
+WORKER_MEMORY_MB = int(os.getenv("WORKER_MEMORY_MB", 160))
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 16))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", 60))
+KEEPALIVE = int(os.getenv("KEEPALIVE", 5))
+
+
+def event_loop():
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol():
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def _read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs this process may use: affinity mask, then cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _read_first_line("/sys/fs/cgroup/cpu.max")  # cgroup v2: "<quota> <period>" or "max <period>"
+    if quota and not quota.startswith("max"):
+        limit, period = (int(part) for part in quota.split()[:2])
+        cpus = min(cpus, max(1, limit // period))
+    else:
+        limit = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")  # cgroup v1
+        period = _read_first_line("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if limit and period and int(limit) > 0:
+            cpus = min(cpus, max(1, int(limit) // int(period)))
+    return cpus
+
+
+def available_memory_mb():
+    """Memory limit of this container (cgroup), falling back to physical RAM"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        value = _read_first_line(path)
+        if value and value.isdigit() and int(value) < 1 << 60:  # v1 reports "unlimited" as a huge number
+            return int(value) // (1024 * 1024)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def worker_count():
+    """Returns (workers, reason)"""
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.getenv("WEB_CONCURRENCY"))), "WEB_CONCURRENCY"
+
+    cpus = available_cpus()
+    workers = 2 * cpus + 1
+    reason = f"2 x {cpus} CPUs + 1"
+
+    memory_mb = available_memory_mb()
+    if memory_mb:
+        # Leave a quarter of the memory for the master, page cache and spikes
+        by_memory = max(1, int(memory_mb * 0.75) // WORKER_MEMORY_MB)
+        if by_memory < workers:
+            workers, reason = by_memory, f"{memory_mb} MB memory / {WORKER_MEMORY_MB} MB per worker"
+
+    max_connections = os.getenv("DB_MAX_CONNECTIONS")
+    if max_connections:
+        pool_size = pool_settings_from_env()["max_size"]
+        by_connections = max(1, int(max_connections) // pool_size)
+        if by_connections < workers:
+            workers, reason = by_connections, f"DB_MAX_CONNECTIONS {max_connections} / pool size {pool_size}"
+
+    if workers > MAX_WORKERS:
+        workers, reason = MAX_WORKERS, f"MAX_WORKERS {MAX_WORKERS}"
+    return workers, reason
+
+
+def run_gunicorn(bind, workers):
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.util import import_app
+
+    class TrendyoftApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return import_app(APP)
+
+    TrendyoftApplication({
+        "bind": bind,
+        "workers": workers,
+        "worker_class": "serve.TrendyoftUvicornWorker",
+        "preload_app": True,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": WORKER_TIMEOUT,
+        "keepalive": KEEPALIVE,
+        "pidfile": PIDFILE,
+        "accesslog": "-" if os.getenv("ACCESS_LOG", "false").lower() in ("1", "true", "yes") else None,
+        "errorlog": "-",
+    }).run()
+
+
+def run_uvicorn(host, port, workers):
+    """Fallback where gunicorn is unavailable (e.g. Windows): no preloading"""
+    import uvicorn
+
+    uvicorn.run(APP, host=host, port=port, workers=workers, loop=event_loop(), http=http_protocol(),
+                timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+
+
+def reload_gracefully(timeout=60):
+    """Start a new master with fresh code (USR2), then retire the old one (TERM)"""
+    old_pid = _read_first_line(PIDFILE)
+    if not old_pid:
+        sys.exit(f"No running server found ({PIDFILE} is missing)")
+    old_pid = int(old_pid)
+    os.kill(old_pid, signal.SIGUSR2)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # The new master takes over the pidfile once it is ready
+        new_pid = _read_first_line(PIDFILE)
+        if new_pid and int(new_pid) != old_pid:
+            os.kill(old_pid, signal.SIGTERM)
+            print(f"✅ Reloaded: master {old_pid} -> {new_pid}, old workers finishing in-flight requests")
+            return
+        time.sleep(0.2)
+    sys.exit(f"New master did not come up within {timeout}s; old master {old_pid} keeps serving")
+
+
+try:
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # uvicorn or gunicorn missing: only the uvicorn fallback is available
+    UvicornWorker = None
+
+if UvicornWorker is not None:
+    class TrendyoftUvicornWorker(UvicornWorker):
+        CONFIG_KWARGS = {"loop": event_loop(), "http": http_protocol(), "lifespan": "on"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with multiple workers")
+    parser.add_argument("command", choices=["run", "reload", "workers"], nargs="?", default="run")
+    parser.add_argument("--bind", default=f"0.0.0.0:{os.getenv('PORT', 8000)}")
+    parser.add_argument("--workers", type=int, default=None, help="override the computed worker count")
+    args = parser.parse_args()
+
+    if args.command == "reload":
+        reload_gracefully()
+        return
+
+    workers, reason = (args.workers, "--workers") if args.workers else worker_count()
+    if args.command == "workers":
+        print(f"{workers} workers ({reason}); loop={event_loop()} http={http_protocol()}")
+        return
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Starting {workers} workers ({reason}), loop={event_loop()}, http={http_protocol()}")
+    if UvicornWorker is not None and importlib.util.find_spec("gunicorn") and os.name != "nt":
+        run_gunicorn(args.bind, workers)
+    else:
+        host, _, port = args.bind.rpartition(":")
+        run_uvicorn(host, int(port), workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Local SMTP sink for development and benchmarks.
+
+Speaks just enough SMTP (EHLO/HELO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT) for smtplib and the API's mail transport, accepts every message and
+throws it away. An optional per-command delay emulates the round-trip time to
+a real provider so connection reuse can be measured without the network.
+
+Usage:
+    python smtp_sink.py [--port 8025] [--latency-ms 0]
+
+Then point the API at it:
+    SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_USE_TLS=false
+"""
+
+import argparse
+import asyncio
+import threading
+
+
+class SMTPSink:
+    """Minimal asyncio SMTP server that accepts and discards mail"""
+
+    def __init__(self, host="127.0.0.1", port=8025, latency=0.0, verbose=False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.verbose = verbose
+        self.messages_received = 0
+        self.sessions = 0
+        self._server = None
+
+    async def _reply(self, writer, line):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.sessions += 1
+        await self._reply(writer, "220 trendyoft-sink ESMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    await self._reply(writer, "250-trendyoft-sink\r\n250-AUTH PLAIN\r\n250 8BITMIME")
+                elif verb == "HELO":
+                    await self._reply(writer, "250 trendyoft-sink")
+                elif verb == "AUTH":
+                    await self._reply(writer, "235 2.7.0 Authentication successful")
+                elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    await self._reply(writer, "250 OK")
+                elif verb == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line in (b".\r\n", b".\n"):
+                            break
+                    self.messages_received += 1
+                    if self.verbose:
+                        print(f"📨 message #{self.messages_received} received")
+                    await self._reply(writer, "250 OK: queued")
+                elif verb == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """Run the sink on a background thread; returns once it is listening"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True, name="smtp-sink").start()
+        ready.wait()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before every server reply")
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, latency=args.latency_ms / 1000, verbose=True)
+    print(f"📭 SMTP sink listening on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        asyncio.run(sink.serve_forever())
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stopped after {sink.messages_received} messages in {sink.sessions} sessions")
+
+
+if __name__ == "__main__":
+    main()
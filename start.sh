@@ -6,5 +6,10 @@ echo "Starting Trendyoft FastAPI application..."
 # Set default port if not provided
 export PORT=${PORT:-8000}
 
-# Start the application with uvicorn
-exec uvicorn main:app --host 0.0.0.0 --port $PORT --workers 1
+# Apply schema migrations before serving (enable when there is no separate release step)
+if [ "${RUN_MIGRATIONS:-false}" = "true" ]; then
+    python migrations.py migrate || exit 1
+fi
+
+# Start gunicorn with preloaded uvicorn workers (count from WEB_CONCURRENCY or CPU/memory)
+exec python serve.py run --bind 0.0.0.0:$PORT